@@ -0,0 +1 @@
+"""Subsystems of the piazan daemon: hardware, audio and monitoring around the scheduler."""
@@ -0,0 +1,33 @@
+"""
+Helpers of the asyncio mode, where every job runs on a single event loop.
+"""
+
+import sys
+
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.base import run_job
+from apscheduler.util import iscoroutinefunction_partial
+
+
+class LoopExecutor(AsyncIOExecutor):
+    """Run every job on the event loop, including plain functions.
+
+    AsyncIOExecutor hands plain functions to the loop's thread pool. The jobs
+    of the daemon are short and never block (they only queue the audio, the
+    output thread waits on the device), so they are called directly from the
+    loop instead, without a worker thread.
+    """
+
+    def _do_submit_job(self, job, run_times):
+        if iscoroutinefunction_partial(job.func):
+            return super()._do_submit_job(job, run_times)
+
+        def run():
+            try:
+                events = run_job(job, job._jobstore_alias, run_times, self._logger.name)
+            except BaseException:
+                self._run_job_error(job.id, *sys.exc_info()[1:])
+            else:
+                self._run_job_success(job.id, events)
+
+        self._eventloop.call_soon_threadsafe(run)
@@ -0,0 +1,165 @@
+"""
+Audio engine of the daemon: per prayer routing of the assets and a single output queue.
+
+Every asset is decoded and converted to the output format once, when it is
+loaded, so playback only hands raw samples to the device. Plays go through a
+queue drained by one thread, a reminder tone requested while the adhan plays
+waits for it instead of being mixed over it. The thread is kept in the asyncio
+mode too: the device API only has a blocking wait for the end of a playback.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from pydub import AudioSegment
+from pydub.playback import _play_with_simpleaudio
+
+from daemon.config import Config
+from prayer_times.contants import FAJR
+
+logger = logging.getLogger('piazan.audio')
+
+# Names of the assets
+ADHAN = 'adhan'
+FAJR_ADHAN = 'fajr_adhan'
+REMINDER = 'reminder'
+IQAMA = 'iqama'
+
+# Output format, the native one of the Pi headphone jack and most USB cards
+OUTPUT_FRAME_RATE = 44100
+OUTPUT_CHANNELS = 2
+OUTPUT_SAMPLE_WIDTH = 2
+
+# a play lasting this much longer than its segment means the device hangs
+STUCK_GRACE_SECONDS = 30.0
+
+
+def asset_paths(config: Config) -> Dict[str, str]:
+    """Get the audio files of the assets set in a config."""
+    paths = {
+        ADHAN: config.adhan_audio,
+        FAJR_ADHAN: config.fajr_adhan_audio,
+        REMINDER: config.reminder_audio,
+        IQAMA: config.iqama_audio,
+    }
+    return {name: path for name, path in paths.items() if path}
+
+
+class AudioEngine:
+    """Play the assets one after the other on the output device."""
+
+    def __init__(self, frame_rate: int = OUTPUT_FRAME_RATE, channels: int = OUTPUT_CHANNELS,
+                 sample_width: int = OUTPUT_SAMPLE_WIDTH,
+                 play: Callable[[AudioSegment], object] = _play_with_simpleaudio,
+                 on_idle: Optional[Callable[[], None]] = None):
+        """Initialize the engine, play starts a playback and returns an object with wait_done and stop."""
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.play = play
+        # called from the output thread when the queue is drained
+        self.on_idle = on_idle
+        self.assets: Dict[str, AudioSegment] = {}
+        self._queue: queue.Queue = queue.Queue()
+        self._current = None
+        # monotonic time by which the current play should be over, None when idle
+        self._due = None
+        self.stuck_grace = STUCK_GRACE_SECONDS
+        # bumped by stop, plays queued before it are skipped
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def prepare(self, segment: AudioSegment) -> AudioSegment:
+        """Convert a segment to the output format, a no-op when it already matches."""
+        return segment.set_frame_rate(self.frame_rate).set_channels(self.channels).set_sample_width(self.sample_width)
+
+    def load(self, paths: Dict[str, str]) -> Dict[str, AudioSegment]:
+        """Decode and convert audio files, keyed by asset name."""
+        assets = {}
+        for name, path in paths.items():
+            logger.info("Loading %s audio %s", name, path)
+            assets[name] = self.prepare(AudioSegment.from_file(path))
+        return assets
+
+    def set_assets(self, assets: Dict[str, AudioSegment]):
+        """Replace the assets, the plays already queued are kept."""
+        self.assets = {name: self.prepare(segment) for name, segment in assets.items()}
+
+    def adhan_for(self, prayer: str) -> str:
+        """Get the asset of the adhan of a prayer."""
+        if prayer == FAJR and FAJR_ADHAN in self.assets:
+            return FAJR_ADHAN
+        return ADHAN
+
+    def enqueue(self, name: str) -> Optional[AudioSegment]:
+        """Queue an asset for playback, None when it is not loaded."""
+        segment = self.assets.get(name)
+        if segment is None:
+            logger.warning("No %s audio loaded", name)
+            return None
+        with self._lock:
+            self._queue.put((self._generation, segment))
+        return segment
+
+    def stop(self):
+        """Stop the current playback and drop the queued ones."""
+        with self._lock:
+            self._generation += 1
+            if self._current is not None:
+                logger.info("Stopping audio")
+                self._current.stop()
+
+    def start(self):
+        """Start the output thread."""
+        self._thread = threading.Thread(target=self._run, name='audio-output', daemon=True)
+        self._thread.start()
+
+    def health(self) -> Optional[str]:
+        """Describe what is wrong with the output, None when it is fine."""
+        if self._thread is None or not self._thread.is_alive():
+            return "audio output thread is not running"
+        due = self._due
+        if due is not None and time.monotonic() > due:
+            return f"audio playback stuck for {time.monotonic() - due + self.stuck_grace:.0f}s past its end"
+        return None
+
+    def wait_idle(self):
+        """Block until every queued play is over."""
+        self._queue.join()
+
+    def close(self):
+        """Stop playing and wait for the output thread to exit."""
+        self.stop()
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        """Play the queued segments one at a time."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            generation, segment = item
+            try:
+                with self._lock:
+                    if generation == self._generation:
+                        self._due = time.monotonic() + segment.duration_seconds + self.stuck_grace
+                        self._current = self.play(segment)
+                    playback = self._current
+                if playback is not None:
+                    playback.wait_done()
+            except Exception:
+                logger.exception("Audio playback failed")
+            finally:
+                with self._lock:
+                    self._current = None
+                    self._due = None
+            if self._queue.empty() and self.on_idle:
+                self.on_idle()
+            self._queue.task_done()
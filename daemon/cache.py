@@ -0,0 +1,150 @@
+"""
+Warm cache of the daemon: the prayer times of the next days and the decoded audio.
+
+``piazan.py warm`` writes it and the daemon loads it at start-up instead of
+computing the schedule and decoding the audio files. The cache is keyed by a
+hash of the config, the audio files and the library version, and every file carries a
+CRC32 checked on load, so a stale or damaged cache is ignored and the daemon
+falls back to computing.
+
+Layout of the cache directory::
+
+    manifest.json   key, first day and checksums of the other files
+    schedule.bin    CompactSchedule.to_bytes()
+    <asset>.pcm     raw samples of each audio asset, in the output format
+"""
+
+import dataclasses
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import tempfile
+import tomllib
+import zlib
+from typing import Dict, NamedTuple, Optional
+
+from pydub import AudioSegment
+
+from daemon.audio import asset_paths
+from daemon.config import Config
+from prayer_times.compact import CompactSchedule
+
+logger = logging.getLogger('piazan.cache')
+
+# bumped when the layout of the cache changes
+CACHE_FORMAT = 2
+
+MANIFEST_NAME = 'manifest.json'
+SCHEDULE_NAME = 'schedule.bin'
+
+
+class WarmState(NamedTuple):
+    """Precomputed start-up state of the daemon."""
+    schedule: CompactSchedule
+    audio: Dict[str, AudioSegment]
+
+
+def library_version() -> str:
+    """Version of piazan, read from pyproject.toml when the project is not installed."""
+    try:
+        return importlib.metadata.version('piazan')
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    pyproject = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pyproject.toml')
+    try:
+        with open(pyproject, 'rb') as f:
+            return tomllib.load(f)['project']['version']
+    except (OSError, KeyError, tomllib.TOMLDecodeError):
+        return 'unknown'
+
+
+def cache_key(config: Config) -> str:
+    """Hash of everything the cached data depends on."""
+    audio = {}
+    for name, path in asset_paths(config).items():
+        stat = os.stat(path)
+        audio[name] = [stat.st_size, stat.st_mtime_ns]
+    key = {
+        'format': CACHE_FORMAT,
+        'version': library_version(),
+        'config': dataclasses.asdict(config),
+        'audio': audio,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+class WarmCache:
+    """Read and write the warm cache in a directory."""
+
+    def __init__(self, directory: str):
+        """Initialize the cache, the directory is created on the first write."""
+        self.directory = directory
+
+    def write(self, config: Config, schedule: CompactSchedule, audio: Dict[str, AudioSegment]):
+        """Store the state computed for a config, the manifest is replaced last."""
+        os.makedirs(self.directory, exist_ok=True)
+        files = {SCHEDULE_NAME: schedule.to_bytes()}
+        for name, segment in audio.items():
+            files[f'{name}.pcm'] = segment.raw_data
+        checksums = {}
+        for name, data in files.items():
+            self._write_atomic(name, data)
+            checksums[name] = {'size': len(data), 'crc32': zlib.crc32(data)}
+
+        manifest = {
+            'key': cache_key(config),
+            'first_day': schedule.first_date.isoformat(),
+            'days': len(schedule),
+            'audio': {
+                name: {'frame_rate': segment.frame_rate, 'channels': segment.channels,
+                       'sample_width': segment.sample_width}
+                for name, segment in audio.items()
+            },
+            'files': checksums,
+        }
+        self._write_atomic(MANIFEST_NAME, json.dumps(manifest, indent=2).encode())
+
+    def load(self, config: Config) -> Optional[WarmState]:
+        """Load the state of a config, None if the cache is missing, stale or damaged."""
+        try:
+            with open(os.path.join(self.directory, MANIFEST_NAME), 'rb') as f:
+                manifest = json.load(f)
+            if manifest.get('key') != cache_key(config):
+                logger.info("Warm cache is stale, it was built for another config or version")
+                return None
+            files = self._read_checked(manifest['files'])
+            audio = {
+                name: AudioSegment(data=files[f'{name}.pcm'], sample_width=audio_format['sample_width'],
+                                   frame_rate=audio_format['frame_rate'], channels=audio_format['channels'])
+                for name, audio_format in manifest['audio'].items()
+            }
+            return WarmState(CompactSchedule.from_buffer(files[SCHEDULE_NAME]), audio)
+        except FileNotFoundError as e:
+            logger.info("No warm cache: %s", e)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring damaged warm cache in %s: %s", self.directory, e)
+        return None
+
+    def _read_checked(self, checksums: Dict[str, Dict[str, int]]) -> Dict[str, bytes]:
+        """Read the files listed in the manifest, raise ValueError on a checksum mismatch."""
+        files = {}
+        for name, expected in checksums.items():
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                data = f.read()
+            if len(data) != expected['size'] or zlib.crc32(data) != expected['crc32']:
+                raise ValueError(f"checksum mismatch of {name}")
+            files[name] = data
+        return files
+
+    def _write_atomic(self, name: str, data: bytes):
+        """Write a file of the cache through a temporary file and a rename."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f'.{name}.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
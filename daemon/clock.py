@@ -0,0 +1,43 @@
+"""
+Clocks of the daemon, every "now" goes through one so that days can be simulated.
+"""
+
+import datetime
+import time
+from typing import Optional
+
+
+class SystemClock:
+    """The real time."""
+
+    def now(self, tzinfo: Optional[datetime.tzinfo] = None) -> datetime.datetime:
+        """Get the current time in a timezone."""
+        return datetime.datetime.now(tzinfo)
+
+    def time(self) -> float:
+        """Get the current POSIX time."""
+        return time.time()
+
+
+class SimulatedClock:
+    """A clock that only moves when it is told to."""
+
+    def __init__(self, start: datetime.datetime):
+        """Initialize the clock at an aware datetime."""
+        self._now = start.astimezone(datetime.timezone.utc)
+
+    def now(self, tzinfo: Optional[datetime.tzinfo] = None) -> datetime.datetime:
+        """Get the simulated time in a timezone."""
+        return self._now.astimezone(tzinfo) if tzinfo else self._now
+
+    def time(self) -> float:
+        """Get the simulated POSIX time."""
+        return self._now.timestamp()
+
+    def set(self, when: datetime.datetime):
+        """Move the clock to an aware datetime, it never goes back."""
+        self._now = max(self._now, when.astimezone(datetime.timezone.utc))
+
+    def advance(self, delta: datetime.timedelta):
+        """Move the clock forward."""
+        self._now += delta
@@ -0,0 +1,232 @@
+"""
+TOML configuration of the daemon, reloaded when the file changes.
+
+The watcher blocks on an inotify file descriptor (Linux only), there is no
+polling. The directory is watched rather than the file so that editors that
+save by renaming a temporary file are picked up too.
+
+Example ``piazan.toml``::
+
+    [location]
+    latitude = 45.583729
+    longitude = -73.750069
+    timezone = "America/Toronto"  # or "auto" to look it up from the coordinates
+
+    [calculation]
+    method = "ISNA"  # or "auto" for the method used in the country of the coordinates
+    school = "STANDARD"
+    hijri_adjustment = 0  # days added to the tabular Hijri calendar
+    latitude_adjustment = "ANGLE_BASED"  # or MIDDLE_OF_THE_NIGHT, ONE_SEVENTH, NONE to skip unreachable times
+
+    [tuning]  # minutes added to each time
+    fajr = 0
+    isha = 2
+
+    [audio]
+    adhan = "./adhan_sound/Adham-Al-Sharqawe.mp3"
+    fajr_adhan = "./adhan_sound/fajr.mp3"     # optional, Fajr uses adhan otherwise
+    reminder = "./adhan_sound/reminder.wav"   # optional, played before each prayer and for the Ramadan alerts
+    reminder_minutes = 10
+    iqama = "./adhan_sound/iqama.wav"         # optional, played after each adhan
+    iqama_minutes = 15
+"""
+
+import ctypes
+import ctypes.util
+import dataclasses
+import logging
+import os
+import select
+import struct
+import threading
+import tomllib
+from typing import Callable, Dict, Optional, Set
+from zoneinfo import ZoneInfo
+
+from prayer_times.contants import (SCHOOL_HANAFI, SCHOOL_STANDARD, LATITUDE_ADJUSTMENT_METHOD_ANGLE,
+                                   LATITUDE_ADJUSTMENT_METHOD_MOTN, LATITUDE_ADJUSTMENT_METHOD_ONESEVENTH,
+                                   LATITUDE_ADJUSTMENT_METHOD_NONE)
+from prayer_times.location import get_method_locator
+from prayer_times.method import Method
+
+logger = logging.getLogger('piazan.config')
+
+# Value of method and timezone resolved from the coordinates
+AUTO = 'auto'
+
+# Keyword arguments accepted by PrayerTimes.tune
+TUNING_NAMES = ('imsak', 'fajr', 'sunrise', 'dhuhr', 'asr', 'maghrib', 'sunset', 'isha', 'midnight')
+
+# Fallbacks for the days on which the sun never reaches the angle of Fajr or Isha
+LATITUDE_ADJUSTMENT_METHODS = (LATITUDE_ADJUSTMENT_METHOD_ANGLE, LATITUDE_ADJUSTMENT_METHOD_MOTN,
+                               LATITUDE_ADJUSTMENT_METHOD_ONESEVENTH, LATITUDE_ADJUSTMENT_METHOD_NONE)
+
+# Fields grouped by what has to be redone when they change
+LOCATION_FIELDS = {'latitude', 'longitude', 'timezone'}
+CALCULATION_FIELDS = {'method', 'school'}
+SCHEDULE_FIELDS = LOCATION_FIELDS | CALCULATION_FIELDS | {'latitude_adjustment_method', 'tuning', 'hijri_adjustment',
+                                                           'reminder_minutes', 'iqama_minutes'}
+AUDIO_FIELDS = {'adhan_audio', 'fajr_adhan_audio', 'reminder_audio', 'iqama_audio'}
+
+
+@dataclasses.dataclass(frozen=True)
+class Config:
+    """Settings of the daemon, the defaults are those of the Laval mosque."""
+    latitude: float = 45.583729
+    longitude: float = -73.750069
+    timezone: str = "America/Toronto"
+    method: str = Method.METHOD_ISNA
+    school: str = SCHOOL_STANDARD
+    hijri_adjustment: int = 0
+    latitude_adjustment_method: str = LATITUDE_ADJUSTMENT_METHOD_ANGLE
+    tuning: Dict[str, int] = dataclasses.field(default_factory=dict)
+    adhan_audio: str = "./adhan_sound/Adham-Al-Sharqawe.mp3"
+    fajr_adhan_audio: Optional[str] = None
+    reminder_audio: Optional[str] = None
+    reminder_minutes: int = 10
+    iqama_audio: Optional[str] = None
+    iqama_minutes: int = 15
+
+    def changes(self, other: 'Config') -> Set[str]:
+        """Get the names of the fields that differ from another config."""
+        return {
+            field.name for field in dataclasses.fields(self)
+            if getattr(self, field.name) != getattr(other, field.name)
+        }
+
+    def zone(self) -> ZoneInfo:
+        """Get the timezone of the location."""
+        return ZoneInfo(self.timezone)
+
+
+def load_config(path: str) -> Config:
+    """Read and validate a TOML config file, missing values take the defaults."""
+    with open(path, 'rb') as f:
+        data = tomllib.load(f)
+
+    defaults = Config()
+    location = data.get('location', {})
+    calculation = data.get('calculation', {})
+    audio = data.get('audio', {})
+    tuning = {name.lower(): int(minutes) for name, minutes in data.get('tuning', {}).items()}
+    latitude = float(location.get('latitude', defaults.latitude))
+    longitude = float(location.get('longitude', defaults.longitude))
+    timezone = location.get('timezone', defaults.timezone)
+    method = calculation.get('method', defaults.method)
+
+    if timezone == AUTO:
+        timezone = get_method_locator().timezone_at(latitude, longitude)
+        if timezone is None:
+            raise ValueError(f"No timezone found at {latitude}, {longitude}")
+    if method == AUTO:
+        method = get_method_locator().method_at(latitude, longitude)
+        logger.info("Using the %s method for %s, %s", method, latitude, longitude)
+
+    config = Config(
+        latitude=latitude,
+        longitude=longitude,
+        timezone=timezone,
+        method=method,
+        school=calculation.get('school', defaults.school),
+        hijri_adjustment=int(calculation.get('hijri_adjustment', defaults.hijri_adjustment)),
+        latitude_adjustment_method=calculation.get('latitude_adjustment', defaults.latitude_adjustment_method),
+        tuning=tuning,
+        adhan_audio=audio.get('adhan', defaults.adhan_audio),
+        fajr_adhan_audio=audio.get('fajr_adhan', defaults.fajr_adhan_audio),
+        reminder_audio=audio.get('reminder', defaults.reminder_audio),
+        reminder_minutes=int(audio.get('reminder_minutes', defaults.reminder_minutes)),
+        iqama_audio=audio.get('iqama', defaults.iqama_audio),
+        iqama_minutes=int(audio.get('iqama_minutes', defaults.iqama_minutes)),
+    )
+
+    if config.method not in Method.get_method_codes():
+        raise ValueError(f"Unknown calculation method {config.method}")
+    if config.school not in (SCHOOL_STANDARD, SCHOOL_HANAFI):
+        raise ValueError(f"Unknown school {config.school}")
+    if config.latitude_adjustment_method not in LATITUDE_ADJUSTMENT_METHODS:
+        raise ValueError(f"Unknown latitude adjustment {config.latitude_adjustment_method}")
+    unknown = set(tuning) - set(TUNING_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown tuning entries {', '.join(sorted(unknown))}")
+    config.zone()
+
+    return config
+
+
+# inotify(7) constants
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class ConfigWatcher:
+    """Reload a config file whenever it is written and report the changes."""
+
+    def __init__(self, path: str, config: Config, on_change: Callable[[Config, Config], Optional[Config]]):
+        """Initialize the watcher with the config currently in use, on_change returns the part it applied."""
+        self.path = os.path.abspath(path)
+        self.config = config
+        self.on_change = on_change
+        self._fd: Optional[int] = None
+        self._stop_read, self._stop_write = os.pipe()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start watching the file from a daemon thread."""
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(self.path).encode()
+        if libc.inotify_add_watch(self._fd, directory, _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {directory.decode()}")
+
+        self._thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching and release the inotify descriptor."""
+        os.write(self._stop_write, b'x')
+        if self._thread:
+            self._thread.join()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def reload(self):
+        """Read the file again and apply it if it changed."""
+        try:
+            new_config = load_config(self.path)
+        except (OSError, ValueError, tomllib.TOMLDecodeError) as e:
+            logger.error("Ignoring invalid config %s: %s", self.path, e)
+            return
+
+        old_config = self.config
+        if not old_config.changes(new_config):
+            return
+        logger.info("Config changed: %s", ', '.join(sorted(old_config.changes(new_config))))
+        applied_config = self.on_change(old_config, new_config)
+        # only what was applied is recorded, a change that failed is applied again on the next write
+        self.config = new_config if applied_config is None else applied_config
+
+    def _run(self):
+        """Block on inotify until the file is written or the watcher is stopped."""
+        name = os.path.basename(self.path).encode()
+        while True:
+            readable, _, _ = select.select([self._fd, self._stop_read], [], [])
+            if self._stop_read in readable:
+                return
+            data = os.read(self._fd, 4096)
+            changed = False
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                if data[offset:offset + length].rstrip(b'\0') == name:
+                    changed = True
+                offset += length
+            if changed:
+                try:
+                    self.reload()
+                except Exception:
+                    logger.exception("Failed to apply the new config")
@@ -0,0 +1,87 @@
+"""
+Physical stop button and status LEDs of the adhan clock.
+
+Everything is driven by gpiozero edge callbacks and scheduler events, nothing
+polls the pins. Set ``GPIOZERO_PIN_FACTORY=mock`` or pass ``mock_pin_factory()``
+to run on a machine without GPIO.
+"""
+
+import logging
+from typing import Callable
+
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED
+from gpiozero import Button, LED
+from gpiozero.pins.mock import MockFactory
+
+logger = logging.getLogger('piazan.gpio')
+
+# BCM pin numbers of the default wiring
+STOP_BUTTON_PIN = 17
+STATUS_LED_PIN = 27
+ERROR_LED_PIN = 22
+
+
+def mock_pin_factory() -> MockFactory:
+    """Get a pin factory simulating the pins, for machines without GPIO."""
+    return MockFactory()
+
+
+class AdhanPanel:
+    """Stop button, status LED and error LED of the adhan clock.
+
+    The status LED is lit while a next prayer is scheduled and blinks when
+    it is coming soon or while an adhan plays. The error LED is lit when a
+    job fails or an adhan is missed, a press on the stop button clears it.
+    """
+
+    def __init__(self, stop_playback: Callable[[], None],
+                 button_pin: int = STOP_BUTTON_PIN,
+                 status_led_pin: int = STATUS_LED_PIN,
+                 error_led_pin: int = ERROR_LED_PIN,
+                 pin_factory=None):
+        """Initialize the devices and register the button callback."""
+        self.stop_playback = stop_playback
+        self.button = Button(button_pin, pin_factory=pin_factory)
+        self.status_led = LED(status_led_pin, pin_factory=pin_factory)
+        self.error_led = LED(error_led_pin, pin_factory=pin_factory)
+        self.button.when_pressed = self.on_stop_pressed
+
+    def listen(self, scheduler):
+        """Follow the job events of an APScheduler scheduler."""
+        scheduler.add_listener(self.on_scheduler_event, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+
+    def on_scheduler_event(self, event):
+        """Show job failures and missed jobs on the error LED."""
+        if event.code == EVENT_JOB_ERROR:
+            logger.warning("Job %s failed, lighting the error LED", event.job_id)
+            self.error_led.on()
+        elif event.code == EVENT_JOB_MISSED:
+            logger.warning("Job %s missed its run time, lighting the error LED", event.job_id)
+            self.error_led.on()
+
+    def on_stop_pressed(self):
+        """Stop the current adhan and acknowledge the error LED."""
+        logger.info("Stop button pressed")
+        self.error_led.off()
+        self.stop_playback()
+
+    def show_next_prayer(self, scheduled: bool):
+        """Light the status LED when a next prayer is scheduled."""
+        if scheduled:
+            self.status_led.on()
+        else:
+            self.status_led.off()
+
+    def show_prayer_soon(self):
+        """Blink the status LED until show_next_prayer is called again."""
+        self.status_led.blink(on_time=0.5, off_time=0.5)
+
+    def show_playing(self):
+        """Blink the status LED fast while an adhan plays."""
+        self.status_led.blink(on_time=0.2, off_time=0.2)
+
+    def close(self):
+        """Release the pins."""
+        self.button.close()
+        self.status_led.close()
+        self.error_led.close()
@@ -0,0 +1,102 @@
+"""
+Logging pipeline: jobs queue their records, a listener thread writes them.
+
+A job calling the logger only filters the record and puts it on a queue,
+the message is formatted and written to the journal by the listener thread,
+so a slow write to an SD card cannot delay an adhan. Messages take %-style
+arguments for the formatting to be deferred as well. Records are written as
+one JSON object per line, the ``extra`` fields of a record included.
+
+Identical messages are rate limited: past ``burst`` records of a message in
+``interval`` seconds they are dropped, and the next one let through carries
+the number of dropped ones in its ``suppressed`` field.
+"""
+
+import datetime
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Sequence, Tuple
+
+# attributes every LogRecord has, the others come from the extra argument
+_RECORD_ATTRIBUTES = frozenset(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue records as they are, the listener thread formats them."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler formats the message here, on the thread of the caller
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Drop the records of a message past a burst of them within an interval."""
+
+    def __init__(self, burst: int = 10, interval: float = 60.0, clock=time.monotonic, max_messages: int = 1024):
+        """Initialize the filter, clock returns seconds and max_messages bounds the messages followed."""
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.clock = clock
+        self.max_messages = max_messages
+        # message -> (window start, records let through, records dropped)
+        self._windows: Dict[tuple, Tuple[float, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Let the record through unless its message is over the limit."""
+        key = (record.name, record.msg, record.args)
+        try:
+            hash(key)
+        except TypeError:
+            key = (record.name, record.msg)
+        now = self.clock()
+        with self._lock:
+            window_start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - window_start >= self.interval:
+                window_start, count = now, 0
+            if count >= self.burst:
+                self._windows[key] = (window_start, count, suppressed + 1)
+                return False
+            self._windows[key] = (window_start, count + 1, 0)
+            if len(self._windows) > self.max_messages:
+                self._windows = {
+                    key: window for key, window in self._windows.items()
+                    if now - window[0] < self.interval or window[2]
+                }
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as a JSON object on a single line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def start_logging(loggers: Sequence[logging.Logger], handler: logging.Handler,
+                  burst: int = 10, interval: float = 60.0) -> QueueListener:
+    """Send the records of the loggers through a queue to the handler, stop the listener to flush it."""
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(burst, interval))
+    for logger in loggers:
+        logger.addHandler(queue_handler)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
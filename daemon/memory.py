@@ -0,0 +1,89 @@
+"""
+Memory diagnostics: RSS sampling and tracemalloc attribution per subsystem.
+
+Python allocations are attributed to the subsystem of the file that made
+them, so the decoded audio shows up under ``audio`` and the job store under
+``scheduler``. Allocations made before tracing started are not seen, run
+with ``python -X tracemalloc`` to include the imports.
+"""
+
+import contextlib
+import os
+import tracemalloc
+from typing import Dict, List, NamedTuple, Optional
+
+# subsystem: path fragments of the files that allocate for it, the first match wins
+SUBSYSTEMS = (
+    # the warm cache reads the decoded audio, its schedule takes a few KiB
+    ('audio', ('/pydub/', '/daemon/audio.py', '/daemon/cache.py')),
+    ('scheduler', ('/apscheduler/',)),
+    ('gpio', ('/gpiozero/', '/daemon/gpio.py')),
+    ('prayer_times', ('/prayer_times/',)),
+    ('numpy', ('/numpy/',)),
+    ('daemon', ('/daemon/', '/piazan.py')),
+)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def rss_bytes() -> int:
+    """Resident set size of the process, from /proc (Linux only)."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE
+
+
+def subsystem_of(filename: str) -> str:
+    """Get the subsystem a source file belongs to."""
+    for subsystem, fragments in SUBSYSTEMS:
+        if any(fragment in filename for fragment in fragments):
+            return subsystem
+    return 'other'
+
+
+def traced_by_subsystem(snapshot: Optional[tracemalloc.Snapshot] = None) -> Dict[str, int]:
+    """Sum the traced memory of a snapshot per subsystem, in bytes."""
+    snapshot = snapshot or tracemalloc.take_snapshot()
+    usage: Dict[str, int] = {}
+    for stat in snapshot.statistics('filename'):
+        subsystem = subsystem_of(stat.traceback[0].filename)
+        usage[subsystem] = usage.get(subsystem, 0) + stat.size
+    return usage
+
+
+class Step(NamedTuple):
+    """Memory taken by a step of the start-up."""
+    name: str
+    rss: int
+    traced: int
+
+
+class MemoryTracker:
+    """Record the RSS and traced memory taken by each step of the daemon."""
+
+    def __init__(self):
+        """Start tracing Python allocations if they are not traced yet."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.steps: List[Step] = []
+        self.start_rss = rss_bytes()
+
+    @contextlib.contextmanager
+    def step(self, name: str):
+        """Measure the memory kept by the code run in the block."""
+        rss = rss_bytes()
+        traced, _ = tracemalloc.get_traced_memory()
+        yield
+        self.steps.append(Step(name, rss_bytes() - rss, tracemalloc.get_traced_memory()[0] - traced))
+
+    def format_report(self) -> str:
+        """Format the steps and the traced memory per subsystem as tables."""
+        lines = [f"{'Step':<24}{'RSS (KiB)':>12}{'Traced (KiB)':>14}"]
+        for step in self.steps:
+            lines.append(f"{step.name:<24}{step.rss // 1024:>12}{step.traced // 1024:>14}")
+        lines.append("")
+        lines.append(f"{'Subsystem':<24}{'Traced (KiB)':>14}")
+        for subsystem, size in sorted(traced_by_subsystem().items(), key=lambda item: -item[1]):
+            lines.append(f"{subsystem:<24}{size // 1024:>14}")
+        lines.append("")
+        lines.append(f"RSS {rss_bytes() // 1024} KiB, {(rss_bytes() - self.start_rss) // 1024} KiB since tracking started")
+        return "\n".join(lines)
@@ -0,0 +1,158 @@
+"""
+Scheduler metrics: lateness, execution time, failures and misfires.
+
+Lateness is measured when the scheduler hands a job to the executor. With
+``coalesce=True`` APScheduler drops the extra run times before emitting any
+event, so a coalesced run shows up as a single late run.
+
+Events only update counters in memory, the Prometheus textfile is written by
+a periodic job so that no I/O happens on the path of an adhan.
+"""
+
+import bisect
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from apscheduler.events import (
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_SUBMITTED,
+)
+
+# Upper bounds in seconds of the histogram buckets
+LATENESS_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0)
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+LOG_LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01)
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: Sequence[float]):
+        """Initialize an empty histogram with the given bucket upper bounds."""
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """Record a value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def to_prometheus(self, name: str) -> List[str]:
+        """Format the histogram as Prometheus text lines."""
+        lines = [f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+class SchedulerMetrics:
+    """Collect job metrics from the events of an APScheduler scheduler."""
+
+    def __init__(self, clock=time.time):
+        """Initialize empty metrics, clock returns the current POSIX time."""
+        self.clock = clock
+        self.lateness = Histogram(LATENESS_BUCKETS)
+        self.duration = Histogram(DURATION_BUCKETS)
+        # time the jobs spent logging before starting the audio
+        self.log_latency = Histogram(LOG_LATENCY_BUCKETS)
+        self.executed = 0
+        self.failed = 0
+        self.missed = 0
+        # constant labels exported as piazan_info, such as the scheduler mode
+        self.info: Dict[str, str] = {}
+        # job id -> (submission time, scheduled run time) of the running jobs
+        self._started: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def listen(self, scheduler):
+        """Follow the job events of an APScheduler scheduler."""
+        scheduler.add_listener(
+            self.on_event,
+            EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED,
+        )
+
+    def on_event(self, event):
+        """Update the metrics from a scheduler event."""
+        now = self.clock()
+        with self._lock:
+            if event.code == EVENT_JOB_SUBMITTED:
+                self._started[event.job_id] = (now, event.scheduled_run_times[-1].timestamp())
+                return
+
+            started = self._started.pop(event.job_id, None)
+            if event.code == EVENT_JOB_MISSED:
+                self.missed += 1
+                return
+
+            if event.code == EVENT_JOB_ERROR:
+                self.failed += 1
+            else:
+                self.executed += 1
+            if started is not None:
+                submitted, scheduled = started
+                self.lateness.observe(max(0.0, submitted - scheduled))
+                self.duration.observe(now - submitted)
+
+    def observe_log_latency(self, seconds: float):
+        """Record the time a fire spent in the logger."""
+        with self._lock:
+            self.log_latency.observe(seconds)
+
+    def to_prometheus(self) -> str:
+        """Format every metric in the Prometheus text exposition format."""
+        with self._lock:
+            lines = []
+            if self.info:
+                labels = ','.join(f'{key}="{value}"' for key, value in sorted(self.info.items()))
+                lines.append("# TYPE piazan_info gauge")
+                lines.append(f"piazan_info{{{labels}}} 1")
+            for name, value in (
+                ('piazan_jobs_executed_total', self.executed),
+                ('piazan_jobs_failed_total', self.failed),
+                ('piazan_jobs_missed_total', self.missed),
+            ):
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value}")
+            lines.append("# TYPE piazan_job_max_lateness_seconds gauge")
+            lines.append(f"piazan_job_max_lateness_seconds {self.lateness.max}")
+            lines.extend(self.lateness.to_prometheus('piazan_job_lateness_seconds'))
+            lines.extend(self.duration.to_prometheus('piazan_job_duration_seconds'))
+            lines.extend(self.log_latency.to_prometheus('piazan_fire_log_seconds'))
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Atomically write the metrics for the node_exporter textfile collector."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.piazan-metrics-')
+        try:
+            # mkstemp creates the file 0600, node_exporter usually runs as another user
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def summary(self) -> str:
+        """One line summary for the status log."""
+        with self._lock:
+            mean = self.lateness.sum / self.lateness.count if self.lateness.count else 0.0
+            return (f"executed={self.executed} failed={self.failed} missed={self.missed} "
+                    f"lateness mean={mean * 1000:.1f}ms max={self.lateness.max * 1000:.1f}ms "
+                    f"logging max={self.log_latency.max * 1e6:.0f}us")
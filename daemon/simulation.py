@@ -0,0 +1,224 @@
+"""
+Time simulation: replay weeks of scheduling in seconds.
+
+``SimulatedScheduler`` is an APScheduler scheduler driven by a
+``SimulatedClock``: ``run_until`` jumps the clock from one run time to the
+next and runs the due jobs synchronously, so a month of midnight cron, DST
+transitions and prayer jobs takes a fraction of a second. Triggers, job
+stores, coalescing and misfire handling are the ones of APScheduler, only
+"now" is simulated. A wake latency can be added to every wake-up to see
+lateness and misfires. ``SimulationRecorder`` keeps every fire with its
+simulated lateness and every change of the schedule.
+"""
+
+import datetime
+import threading
+from traceback import format_tb
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from apscheduler.events import (
+    EVENT_JOB_ADDED, EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, EVENT_JOB_MODIFIED,
+    EVENT_JOB_REMOVED, EVENT_JOB_SUBMITTED, JobExecutionEvent, JobSubmissionEvent,
+)
+from apscheduler.executors.base import BaseExecutor
+from apscheduler.schedulers.base import BaseScheduler
+
+from daemon.clock import SimulatedClock
+
+
+class SimulatedExecutor(BaseExecutor):
+    """Run jobs right away in the calling thread, misfires are judged on the simulated clock."""
+
+    def __init__(self, clock: SimulatedClock):
+        """Initialize the executor with the clock of the simulation."""
+        super().__init__()
+        self.clock = clock
+
+    def _do_submit_job(self, job, run_times):
+        events = []
+        for run_time in run_times:
+            late = self.clock.now(datetime.timezone.utc) - run_time
+            if job.misfire_grace_time is not None and late > datetime.timedelta(seconds=job.misfire_grace_time):
+                events.append(JobExecutionEvent(EVENT_JOB_MISSED, job.id, job._jobstore_alias, run_time))
+                continue
+            try:
+                retval = job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                self._logger.exception(f'Job "{job}" raised an exception')
+                events.append(JobExecutionEvent(EVENT_JOB_ERROR, job.id, job._jobstore_alias, run_time,
+                                                exception=e, traceback=''.join(format_tb(e.__traceback__))))
+                continue
+            events.append(JobExecutionEvent(EVENT_JOB_EXECUTED, job.id, job._jobstore_alias, run_time, retval=retval))
+        self._run_job_success(job.id, events)
+
+
+class SimulatedScheduler(BaseScheduler):
+    """APScheduler scheduler whose time is a SimulatedClock."""
+
+    def __init__(self, clock: SimulatedClock, wake_latency: datetime.timedelta = datetime.timedelta(0),
+                 settle: Optional[Callable[[], None]] = None, **options):
+        """Initialize the scheduler, settle is called after the jobs of each wake-up ran."""
+        self.clock = clock
+        self.wake_latency = wake_latency
+        self.settle = settle
+        super().__init__(**options)
+
+    def _create_default_executor(self):
+        return SimulatedExecutor(self.clock)
+
+    def _real_add_job(self, job, jobstore_alias, replace_existing):
+        # the first run time would be computed from the real time otherwise
+        if not hasattr(job, 'next_run_time'):
+            job._modify(next_run_time=job.trigger.get_next_fire_time(None, self.clock.now(self.timezone)))
+        super()._real_add_job(job, jobstore_alias, replace_existing)
+
+    def reschedule_job(self, job_id, jobstore=None, trigger='date', **trigger_args):
+        trigger = self._create_trigger(trigger, trigger_args)
+        next_run_time = trigger.get_next_fire_time(None, self.clock.now(self.timezone))
+        return self.modify_job(job_id, jobstore, trigger=trigger, next_run_time=next_run_time)
+
+    def shutdown(self, wait=True):
+        """Stop the scheduler and drop its jobs, which hold on to the state of the simulated daemon."""
+        # jobs only run from run_until, there is never one to wait for
+        self.remove_all_jobs()
+        super().shutdown(wait=False)
+
+    def wakeup(self):
+        # jobs only run from run_until
+        pass
+
+    def next_run_time(self) -> Optional[datetime.datetime]:
+        """Earliest run time of all the jobs."""
+        with self._jobstores_lock:
+            run_times = [store.get_next_run_time() for store in self._jobstores.values()]
+        run_times = [run_time for run_time in run_times if run_time is not None]
+        return min(run_times) if run_times else None
+
+    def run_until(self, end: datetime.datetime):
+        """Run every job due up to end, moving the clock to each wake-up."""
+        while True:
+            next_run_time = self.next_run_time()
+            if next_run_time is None or next_run_time > end:
+                break
+            self.clock.set(next_run_time + self.wake_latency)
+            self._run_due_jobs()
+        self.clock.set(end)
+
+    def _run_due_jobs(self):
+        """Submit the due jobs like BaseScheduler._process_jobs, at the simulated time."""
+        now = self.clock.now(self.timezone)
+        submissions = []
+        with self._jobstores_lock:
+            for jobstore_alias, jobstore in self._jobstores.items():
+                for job in jobstore.get_due_jobs(now):
+                    run_times = job._get_run_times(now)
+                    run_times = run_times[-1:] if run_times and job.coalesce else run_times
+                    if not run_times:
+                        continue
+                    submissions.append((job, jobstore_alias, run_times))
+                    job_next_run = job.trigger.get_next_fire_time(run_times[-1], now)
+                    if job_next_run:
+                        job._modify(next_run_time=job_next_run)
+                        jobstore.update_job(job)
+                    else:
+                        self.remove_job(job.id, jobstore_alias)
+
+        for job, jobstore_alias, run_times in submissions:
+            self._dispatch_event(JobSubmissionEvent(EVENT_JOB_SUBMITTED, job.id, jobstore_alias, run_times))
+            self._lookup_executor(job.executor).submit_job(job, run_times)
+        if self.settle:
+            self.settle()
+
+
+class Fire(NamedTuple):
+    """A run of a job in the simulation."""
+    name: str
+    scheduled: datetime.datetime
+    fired: datetime.datetime
+    outcome: str
+
+    @property
+    def lateness(self) -> float:
+        """Seconds between the scheduled and the simulated run time."""
+        return (self.fired - self.scheduled).total_seconds()
+
+
+class ScheduleChange(NamedTuple):
+    """A job added, modified or removed in the simulation."""
+    time: datetime.datetime
+    change: str
+    name: str
+    next_run_time: Optional[datetime.datetime]
+
+
+_OUTCOMES = {EVENT_JOB_EXECUTED: 'executed', EVENT_JOB_ERROR: 'error', EVENT_JOB_MISSED: 'missed'}
+_CHANGES = {EVENT_JOB_ADDED: 'added', EVENT_JOB_MODIFIED: 'modified', EVENT_JOB_REMOVED: 'removed'}
+
+
+class SimulationRecorder:
+    """Record the fires and schedule changes of a simulated scheduler."""
+
+    def __init__(self, scheduler: SimulatedScheduler):
+        """Start listening to the events of the scheduler."""
+        self.scheduler = scheduler
+        self.fires: List[Fire] = []
+        self.changes: List[ScheduleChange] = []
+        # job id -> name, removed jobs cannot be looked up anymore
+        self._names: Dict[str, str] = {}
+        scheduler.add_listener(self.on_event, EVENT_JOB_ADDED | EVENT_JOB_MODIFIED | EVENT_JOB_REMOVED
+                               | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+
+    def on_event(self, event):
+        """Record a scheduler event at the simulated time."""
+        now = self.scheduler.clock.now(datetime.timezone.utc)
+        if event.code in _OUTCOMES:
+            self.fires.append(Fire(self._names.get(event.job_id, event.job_id), event.scheduled_run_time,
+                                   now, _OUTCOMES[event.code]))
+            return
+
+        job = self.scheduler.get_job(event.job_id) if event.code != EVENT_JOB_REMOVED else None
+        if job is not None:
+            self._names[event.job_id] = job.name
+        self.changes.append(ScheduleChange(now, _CHANGES[event.code], self._names.get(event.job_id, event.job_id),
+                                           getattr(job, 'next_run_time', None)))
+
+    def fires_of(self, name: str) -> List[Fire]:
+        """Get the fires of the jobs of a name, the name of a function job is its qualified name."""
+        return [fire for fire in self.fires if fire.name == name]
+
+
+class FakePlayback:
+    """Playback of the fake sink, it is over as soon as it starts."""
+
+    def wait_done(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class HungPlayback:
+    """Playback of a device that hangs, it is only over once stopped."""
+
+    def __init__(self):
+        self._stopped = threading.Event()
+
+    def wait_done(self):
+        self._stopped.wait()
+
+    def stop(self):
+        self._stopped.set()
+
+
+class FakeAudioSink:
+    """Stand-in for the output device, records what is played and when."""
+
+    def __init__(self, clock: SimulatedClock):
+        """Initialize the sink with the clock of the simulation."""
+        self.clock = clock
+        self.plays: List[tuple] = []
+
+    def __call__(self, segment) -> FakePlayback:
+        """Record a play, used as the play function of AudioEngine."""
+        self.plays.append((self.clock.now(datetime.timezone.utc), len(segment)))
+        return FakePlayback()
@@ -0,0 +1,169 @@
+"""
+Watchdog: systemd notify protocol and a health heartbeat.
+
+``SystemdNotifier`` sends sd_notify messages as datagrams to the socket of
+NOTIFY_SOCKET and does nothing when the daemon is not started by systemd.
+The heartbeat is a scheduler job: when the scheduler thread dies or the event
+loop is blocked the pings stop and systemd restarts the service once
+WatchdogSec runs out. Each beat also runs the health checks (next prayer job,
+audio output) and measures its own lag; after ``failures`` unhealthy beats in
+a row it sends WATCHDOG=trigger so systemd restarts the service right away.
+A beat only reads state kept in memory and sends one datagram.
+
+    [Service]
+    Type=notify
+    WatchdogSec=30
+    Restart=on-failure
+"""
+
+import logging
+import os
+import socket
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger('piazan.watchdog')
+
+# the heartbeat runs this often when systemd does not set a watchdog timeout
+HEARTBEAT_INTERVAL_SECONDS = 15.0
+
+# a heartbeat running later than this is reported as scheduler lag
+MAX_LAG_SECONDS = 5.0
+
+
+def watchdog_timeout(environ=os.environ) -> Optional[float]:
+    """WatchdogSec of the service in seconds, None when systemd does not watch this process."""
+    usec = environ.get('WATCHDOG_USEC')
+    pid = environ.get('WATCHDOG_PID')
+    if not usec or (pid and int(pid) != os.getpid()):
+        return None
+    return int(usec) / 1e6
+
+
+class SystemdNotifier:
+    """Send sd_notify messages, a no-op without a notify socket."""
+
+    def __init__(self, address: Optional[str] = None):
+        """Initialize the notifier, the address defaults to NOTIFY_SOCKET."""
+        address = address if address is not None else os.environ.get('NOTIFY_SOCKET')
+        # "@" stands for the abstract namespace
+        self.address = '\0' + address[1:] if address and address.startswith('@') else address
+        self._socket: Optional[socket.socket] = None
+        if self.address:
+            # a full socket drops the message instead of blocking the heartbeat
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC | socket.SOCK_NONBLOCK)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the messages go to systemd."""
+        return self._socket is not None
+
+    def notify(self, *fields: str) -> bool:
+        """Send KEY=VALUE fields in a single message."""
+        if self._socket is None:
+            return False
+        try:
+            self._socket.sendto('\n'.join(fields).encode(), self.address)
+        except OSError as e:
+            logger.warning("Cannot notify systemd: %s", e)
+            return False
+        return True
+
+    def ready(self):
+        """Tell systemd the daemon is up."""
+        self.notify('READY=1', f'MAINPID={os.getpid()}')
+
+    def stopping(self):
+        """Tell systemd the daemon is shutting down."""
+        self.notify('STOPPING=1')
+
+    def close(self):
+        """Close the socket."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class Watchdog:
+    """Run the health checks on every heartbeat and ping or trigger the systemd watchdog."""
+
+    def __init__(self, notifier: SystemdNotifier, checks: Dict[str, Callable[[], Optional[str]]],
+                 interval: float = HEARTBEAT_INTERVAL_SECONDS, max_lag: float = MAX_LAG_SECONDS,
+                 failures: int = 2, clock=time.monotonic):
+        """Initialize the watchdog, a check returns what is wrong or None."""
+        self.notifier = notifier
+        self.checks = checks
+        self.interval = interval
+        self.max_lag = max_lag
+        # a check can fail once while the midnight recompute replaces the jobs
+        self.failures = failures
+        self.clock = clock
+        self.beats = 0
+        self.max_lag_seen = 0.0
+        self.problems: List[str] = []
+        self._unhealthy_beats = 0
+        self._last_beat: Optional[float] = None
+        self._status: Optional[str] = None
+
+    def beat(self) -> List[str]:
+        """Check the daemon and notify systemd, returns the problems found."""
+        now = self.clock()
+        problems = []
+        if self._last_beat is not None:
+            lag = now - self._last_beat - self.interval
+            self.max_lag_seen = max(self.max_lag_seen, lag)
+            if lag > self.max_lag:
+                problems.append(f"heartbeat {lag:.1f}s late")
+        self._last_beat = now
+        for name, check in self.checks.items():
+            try:
+                problem = check()
+            except Exception as e:
+                problem = f"{name} check failed: {e}"
+            if problem:
+                problems.append(problem)
+
+        self.beats += 1
+        self.problems = problems
+        self._unhealthy_beats = self._unhealthy_beats + 1 if problems else 0
+        status = f"Unhealthy: {'; '.join(problems)}" if problems else "Healthy"
+        fields = ['WATCHDOG=trigger' if self._unhealthy_beats >= self.failures else 'WATCHDOG=1']
+        if status != self._status:
+            # sent on changes only, a healthy beat is a single short datagram
+            self._status = status
+            fields.append(f'STATUS={status}')
+            if problems:
+                logger.error("%s", status)
+            else:
+                logger.info("%s", status)
+        self.notifier.notify(*fields)
+        return problems
+
+
+class FakeNotifySocket:
+    """Local stand-in for the notify socket of systemd, collects the messages."""
+
+    def __init__(self):
+        """Bind a datagram socket in a temporary directory."""
+        self._directory = tempfile.mkdtemp(prefix='piazan-notify-')
+        self.address = os.path.join(self._directory, 'notify')
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.address)
+        self._socket.setblocking(False)
+
+    def receive(self) -> List[Dict[str, str]]:
+        """Get the messages received since the last call, as KEY: VALUE dicts."""
+        messages = []
+        while True:
+            try:
+                data = self._socket.recv(4096)
+            except BlockingIOError:
+                return messages
+            messages.append(dict(line.split('=', 1) for line in data.decode().splitlines()))
+
+    def close(self):
+        """Close and remove the socket."""
+        self._socket.close()
+        os.unlink(self.address)
+        os.rmdir(self._directory)
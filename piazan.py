@@ -1,40 +1,60 @@
 #!/usr/bin/env -S uv run --script
 
+import argparse
+import asyncio
+import atexit
+import dataclasses
 import datetime
-from prayer_times.prayer_times import PrayerTimes
-from prayer_times.method import Method
-from prayer_times.contants import TIME_FORMAT_12H
-import pytz
+import os
+import signal
+import threading
+import time
+from prayer_times.batch import BatchPrayerTimes
+from prayer_times.schedule import PrayerSchedule, SCHEDULED_PRAYERS, RAMADAN_ALERTS
+from prayer_times.hijri import get_hijri_calendar
+from prayer_times.contants import IMSAK, LAST_THIRD
+from prayer_times.compact import CompactSchedule
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor
-from pydub.playback import _play_with_simpleaudio
-from pydub import AudioSegment
 import logging
-from typing import Dict
+from typing import Dict, List, Optional
 from apscheduler.job import Job
+from apscheduler.jobstores.base import JobLookupError
+from gpiozero.exc import GPIOZeroError
+from pydub.exceptions import CouldntDecodeError
+from daemon.gpio import AdhanPanel
+from daemon.metrics import SchedulerMetrics
+from daemon.aio import LoopExecutor
+from daemon.cache import WarmCache
+from daemon.audio import AudioEngine, asset_paths, REMINDER, IQAMA
+from daemon.logs import JsonFormatter, start_logging
+from daemon.memory import MemoryTracker, rss_bytes
+from daemon.clock import SystemClock
+from daemon.watchdog import SystemdNotifier, Watchdog, watchdog_timeout, HEARTBEAT_INTERVAL_SECONDS
+from daemon.config import Config, ConfigWatcher, load_config, AUDIO_FIELDS, CALCULATION_FIELDS, SCHEDULE_FIELDS
 
+# JSON lines by default, --log-format text switches to the plain formatter
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 std_handler = logging.StreamHandler()
-std_handler.setFormatter(formatter)
+std_handler.setFormatter(JsonFormatter())
 
 logger = logging.getLogger('piazan')
-
-logger.addHandler(std_handler)
 logger.setLevel(logging.INFO)
 
+# jobs only queue their records, the listener thread formats and writes them
+log_listener = start_logging([logger, logging.getLogger('apscheduler')], std_handler)
+atexit.register(log_listener.stop)
+
 
 # holds jobs in memory used for status display
 status_jobs: Dict[str, Job] = {}
 
-jobstores = {
-    'default': MemoryJobStore(),
-}
-
-executors = {
-    'default': ThreadPoolExecutor(max_workers=10),
-}
+# held while the prayer jobs are replaced or read, in the threaded mode the config
+# watcher and the midnight recompute can replace them at the same time
+schedule_lock = threading.RLock()
 
 job_defaults = {
     'coalesce': True,
@@ -42,91 +62,407 @@ job_defaults = {
     'misfire_grace_time': 60,
 }
 
-scheduler = BackgroundScheduler(jobstores=jobstores, executors=executors, job_defaults=job_defaults)
+# BackgroundScheduler or AsyncIOScheduler depending on the mode, see create_scheduler
+scheduler = None
 
-pt_isna = PrayerTimes(method=Method.METHOD_ISNA)
-    
+# event loop of the asyncio mode, None in the threaded mode
+event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def create_scheduler(use_asyncio: bool):
+    jobstores = {
+        'default': MemoryJobStore(),
+    }
+    if use_asyncio:
+        executors = {
+            'default': LoopExecutor(),
+        }
+        return AsyncIOScheduler(jobstores=jobstores, executors=executors, job_defaults=job_defaults, event_loop=event_loop)
+
+    executors = {
+        'default': ThreadPoolExecutor(max_workers=10),
+    }
+    return BackgroundScheduler(jobstores=jobstores, executors=executors, job_defaults=job_defaults)
+
+def call_in_daemon(func, *args):
+    # callbacks from other threads (GPIO, config watcher) run on the loop in asyncio mode
+    if event_loop is not None:
+        event_loop.call_soon_threadsafe(func, *args)
+    else:
+        func(*args)
+
+# every "now" of the daemon, replaced by a SimulatedClock to replay days in seconds
+clock = SystemClock()
+
+# lateness, misses and durations of every job, exported for node_exporter
+metrics = SchedulerMetrics(clock=lambda: clock.time())
+METRICS_TEXTFILE = "./piazan.prom"
+METRICS_WRITE_INTERVAL_SECONDS = 60
+STATUS_INTERVAL_MINUTES = 60
+
+CONFIG_PATH = "./piazan.toml"
+
+def read_config() -> Config:
+    if os.path.exists(CONFIG_PATH):
+        return load_config(CONFIG_PATH)
+    logger.info("No %s, using the default config", CONFIG_PATH)
+    return Config()
+
+config = read_config()
+local_timezone = config.zone()
+
+# kept across config reloads as long as the method and school do not change
+prayer_calculator = BatchPrayerTimes(method=config.method, school=config.school)
+prayer_calculator.tune(**config.tuning)
+# unreachable sun angles take the latitude adjustment, or are skipped without one
+prayer_calculator.set_clamp_sun_angles(False)
+
+# Hijri dates of the multi-year table, shifted to follow the local moon sighting
+hijri_calendar = get_hijri_calendar(config.hijri_adjustment)
+
+# in the order of the day, the Ramadan alerts are only kept during Ramadan
+DAEMON_PRAYERS = (IMSAK,) + SCHEDULED_PRAYERS + (LAST_THIRD,)
 
-LAVAL_LATITUDE = 45.583729
-LAVAL_LONGITUDE = -73.750069
-LAVAL_TIMEZONE = pytz.timezone("America/Toronto")
+def create_prayer_schedule(days: int = 7) -> PrayerSchedule:
+    seasons = {alert: hijri_calendar.is_ramadan for alert in RAMADAN_ALERTS}
+    return PrayerSchedule(prayer_calculator, config.latitude, config.longitude, local_timezone, days=days,
+                          prayers=DAEMON_PRAYERS, latitude_adjustment_method=config.latitude_adjustment_method,
+                          seasons=seasons)
 
-Adham_Al_Sharqawe_Adhan_Audio_Segment = AudioSegment.from_mp3("./adhan_sound/Adham-Al-Sharqawe.mp3")
+# next days of prayers, indexed by time for the status display
+prayer_schedule = create_prayer_schedule()
 
-def play_non_blocking(audio_segment):
-    playback = _play_with_simpleaudio(audio_segment)
-    return playback
+# assets are loaded at start-up by load_startup_state, from the warm cache when it is fresh
+audio_engine = AudioEngine(on_idle=lambda: panel and call_in_daemon(panel.show_next_prayer, True))
+
+# written by `piazan.py warm`, holds the next days of prayer times and the decoded audio
+WARM_CACHE_DIR = "./piazan-cache"
+WARM_CACHE_DAYS = 30
+warm_cache = WarmCache(WARM_CACHE_DIR)
+
+# adhan and LED jobs of the current day, replaced when the schedule changes
+prayer_jobs: List[Job] = []
+
+# how long before a prayer the status LED starts blinking
+PRAYER_SOON_DELTA = datetime.timedelta(minutes=10)
+
+# stop button and status LEDs, None when the board has no GPIO
+panel: Optional[AdhanPanel] = None
+
+# sd_notify messages to systemd, does nothing when not run by systemd
+notifier = SystemdNotifier()
+
+# heartbeat job checking the prayer jobs and the audio, set up by start_daemon
+watchdog: Optional[Watchdog] = None
+
+def stop_adhan():
+    audio_engine.stop()
+
+def log_fire(message, *args, **fields):
+    # runs right before the audio starts, the time it takes is measured on every fire
+    start = time.perf_counter()
+    logger.info(message, *args, extra=fields)
+    metrics.observe_log_latency(time.perf_counter() - start)
 
 def prayer_adhan_function(prayer_name):
-    logger.info(f"Playing adhan for {prayer_name}")
+    log_fire("Playing adhan for %s", prayer_name, event='adhan', prayer=prayer_name)
+    audio_engine.enqueue(audio_engine.adhan_for(prayer_name))
 
-    play_non_blocking(Adham_Al_Sharqawe_Adhan_Audio_Segment)
+    if panel:
+        panel.show_playing()
 
+def play_reminder(prayer_name):
+    log_fire("Playing reminder for %s", prayer_name, event='reminder', prayer=prayer_name)
+    audio_engine.enqueue(REMINDER)
 
-def schedule_prayer_times():
-    logger.info("Scheduling prayer times")
-    today_date = LAVAL_TIMEZONE.localize(datetime.datetime.now())
-    
-    logger.info("=== Prayer Times for Montreal, Canada ===")
-    logger.info(f"Date: {today_date}")
-    logger.info(f"Coordinates: {LAVAL_LATITUDE}, {LAVAL_LONGITUDE}")
-    logger.info(f"Method: {pt_isna.get_method()}")
+def play_iqama(prayer_name):
+    log_fire("Playing iqama for %s", prayer_name, event='iqama', prayer=prayer_name)
+    audio_engine.enqueue(IQAMA)
 
-    
-    # Get prayer times for today
-    times = pt_isna.get_times_for_today(LAVAL_LATITUDE, LAVAL_LONGITUDE, today_date)
-    
-    # Display prayer times
-    prayer_names = {
-        'Fajr': 'Fajr',
-        'Dhuhr': 'Dhuhr',
-        'Asr': 'Asr',
-        'Maghrib': 'Maghrib',
-        'Isha': 'Isha',
-    }
-    
-    for prayer, time in times.items():
-        if prayer in prayer_names:
-            hour, minute = time.split(':')
-            prayer_datetime = today_date.replace(hour=int(hour), minute=int(minute), second=0)
-            logger.info(f"Scheduling {prayer_names[prayer]} for {prayer_datetime} at {time}")
-            job = scheduler.add_job(prayer_adhan_function, 'date', run_date=prayer_datetime, args=[prayer_names[prayer]])
-            status_jobs[prayer_names[prayer]] = job
-    
+def play_ramadan_alert(alert_name):
+    log_fire("Ramadan alert for %s", alert_name, event='ramadan_alert', prayer=alert_name)
+    audio_engine.enqueue(REMINDER)
+
+
+def clear_prayer_jobs():
+    with schedule_lock:
+        for job in prayer_jobs:
+            try:
+                job.remove()
+            except JobLookupError:
+                # already ran
+                pass
+        prayer_jobs.clear()
+        for prayer in DAEMON_PRAYERS:
+            status_jobs.pop(prayer, None)
+
+
+def schedule_prayer_times(now: Optional[datetime.datetime] = None):
+    with schedule_lock:
+        logger.info("Scheduling prayer times")
+        clear_prayer_jobs()
+        today_date = now or clock.now(local_timezone)
+
+        logger.info("=== Prayer Times for %s ===", config.timezone)
+        logger.info("Date: %s (%s)", today_date, hijri_calendar.to_hijri(today_date.date()))
+        logger.info("Coordinates: %s, %s", config.latitude, config.longitude)
+        logger.info("Method: %s", prayer_calculator.get_method())
+
+
+        # Get prayer times for today, the schedule only computes the days it does not hold yet
+        prayer_schedule.refill(today_date)
+        day_start = datetime.datetime.combine(today_date.date(), datetime.time(0), tzinfo=local_timezone)
+
+        # Prayers already past are skipped, they would only be reported as missed
+        for prayer in prayer_schedule.prayers_between(today_date, day_start + datetime.timedelta(days=1)):
+            if prayer.adjusted:
+                logger.info("Scheduling %s for %s, the sun does not reach its angle, %s", prayer.name, prayer.time,
+                            config.latitude_adjustment_method)
+            else:
+                logger.info("Scheduling %s for %s", prayer.name, prayer.time)
+            if prayer.name in RAMADAN_ALERTS:
+                # the alerts play the reminder tone, without one there is nothing to play
+                if REMINDER not in audio_engine.assets:
+                    continue
+                job = scheduler.add_job(play_ramadan_alert, 'date', run_date=prayer.time, args=[prayer.name])
+                status_jobs[prayer.name] = job
+                prayer_jobs.append(job)
+                continue
+            job = scheduler.add_job(prayer_adhan_function, 'date', run_date=prayer.time, args=[prayer.name])
+            status_jobs[prayer.name] = job
+            prayer_jobs.append(job)
+            if panel and prayer.time - PRAYER_SOON_DELTA > today_date:
+                prayer_jobs.append(scheduler.add_job(panel.show_prayer_soon, 'date', run_date=prayer.time - PRAYER_SOON_DELTA))
+            reminder_time = prayer.time - datetime.timedelta(minutes=config.reminder_minutes)
+            if REMINDER in audio_engine.assets and reminder_time > today_date:
+                prayer_jobs.append(scheduler.add_job(play_reminder, 'date', run_date=reminder_time, args=[prayer.name]))
+            if IQAMA in audio_engine.assets:
+                iqama_time = prayer.time + datetime.timedelta(minutes=config.iqama_minutes)
+                prayer_jobs.append(scheduler.add_job(play_iqama, 'date', run_date=iqama_time, args=[prayer.name]))
+
+        if panel:
+            panel.show_next_prayer(prayer_schedule.next_prayer(today_date) is not None)
+
+        # Runs again at the next local midnight. A date job rather than a cron one: the cron
+        # trigger of APScheduler 3.11 skips the midnight that follows a spring forward DST change.
+        # It has no misfire grace time, the job that schedules every following day must run however late
+        next_midnight = datetime.datetime.combine(today_date.date() + datetime.timedelta(days=1), datetime.time(0), tzinfo=local_timezone)
+        job = scheduler.add_job(schedule_prayer_times, 'date', run_date=next_midnight,
+                                id='recompute_prayer_times', replace_existing=True, misfire_grace_time=None)
+        status_jobs['recompute_prayer_times'] = job
+
+
+def on_config_change(old_config: Config, new_config: Config) -> Config:
+    changes = old_config.changes(new_config)
+    applied_config = new_config
+    if changes & AUDIO_FIELDS:
+        try:
+            # decoded on the watcher thread before anything changes, then swapped in
+            assets = audio_engine.load(asset_paths(new_config))
+        except (OSError, CouldntDecodeError) as e:
+            # the other changes are still applied, the audio stays as it was until the next write
+            logger.error("Keeping the current audio, cannot load the new one: %s", e)
+            applied_config = dataclasses.replace(new_config, **{field: getattr(old_config, field) for field in AUDIO_FIELDS})
+        else:
+            audio_engine.set_assets(assets)
+            if not changes & SCHEDULE_FIELDS:
+                # reminder and iqama jobs depend on which assets are set
+                call_in_daemon(schedule_prayer_times)
+
+    if old_config.changes(applied_config):
+        call_in_daemon(apply_config, old_config, applied_config)
+    return applied_config
+
+
+def apply_config(old_config: Config, new_config: Config):
+    global config, local_timezone, prayer_calculator, prayer_schedule, hijri_calendar
+    with schedule_lock:
+        changes = old_config.changes(new_config)
+
+        if changes & CALCULATION_FIELDS:
+            prayer_calculator = BatchPrayerTimes(method=new_config.method, school=new_config.school)
+            prayer_calculator.set_clamp_sun_angles(False)
+        if changes & (CALCULATION_FIELDS | {'tuning'}):
+            prayer_calculator.tune(**new_config.tuning)
+
+        config = new_config
+        local_timezone = new_config.zone()
+        hijri_calendar = get_hijri_calendar(new_config.hijri_adjustment)
+
+        # only the jobs of the prayers and the midnight recompute are replaced, the other jobs keep running
+        if changes & SCHEDULE_FIELDS:
+            prayer_schedule = create_prayer_schedule()
+            schedule_prayer_times()
 
-    
     
 def scheduler_status():
     logger.info("========================= Scheduler Status ======================")
-    for job_name, job in status_jobs.items():
-        logger.info(f"Job {job_name:<30} next run: {job.next_run_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    with schedule_lock:
+        jobs = list(status_jobs.items())
+    for job_name, job in jobs:
+        logger.info("Job %-30s next run: %s", job_name, job.next_run_time.strftime('%Y-%m-%d %H:%M:%S'))
+    now = clock.now(local_timezone)
+    next_prayer = prayer_schedule.next_prayer(now)
+    if next_prayer:
+        time_left = datetime.timedelta(seconds=round(next_prayer.time.timestamp() - now.timestamp()))
+        logger.info("Next prayer: %s at %s (in %s)", next_prayer.name, next_prayer.time.strftime('%H:%M'), time_left)
+    logger.info("Jobs: %s", metrics.summary())
+    logger.info("Memory: RSS %d KiB, %d jobs", rss_bytes() // 1024, len(scheduler.get_jobs()))
+    if watchdog:
+        logger.info("Watchdog: %d beats, max lag %.1fs, systemd %s", watchdog.beats, watchdog.max_lag_seen,
+                    'notified' if notifier.enabled else 'not found')
     logger.info("========================= Scheduler Status ======================")
 
-if __name__ == "__main__":
+def check_prayer_jobs() -> Optional[str]:
+    with schedule_lock:
+        # the next prayer of the day must have its job, and the midnight recompute must be pending
+        now = clock.now(local_timezone)
+        recompute = scheduler.get_job('recompute_prayer_times')
+        if recompute is None or recompute.next_run_time is None or recompute.next_run_time <= now:
+            return "the midnight recompute is not scheduled"
+        # the Ramadan alerts only get a job when the reminder tone is set
+        scheduled = [prayer for prayer in prayer_schedule.prayers_between(now, recompute.next_run_time)
+                     if prayer.time > now and (prayer.name not in RAMADAN_ALERTS or REMINDER in audio_engine.assets)]
+        if scheduled:
+            next_prayer = scheduled[0]
+            job = status_jobs.get(next_prayer.name)
+            if job is None or scheduler.get_job(job.id) is None or job.next_run_time <= now:
+                return f"no job for {next_prayer.name} at {next_prayer.time.strftime('%H:%M')}"
+        return None
+
+def create_watchdog(watchdog_notifier: SystemdNotifier, watchdog_clock=time.monotonic) -> Watchdog:
+    # pings twice per WatchdogSec as systemd recommends
+    timeout = watchdog_timeout()
+    interval = timeout / 2 if timeout else HEARTBEAT_INTERVAL_SECONDS
+    checks = {'prayer jobs': check_prayer_jobs, 'audio': audio_engine.health}
+    return Watchdog(watchdog_notifier, checks, interval=interval, clock=watchdog_clock)
+
+
+def load_startup_state():
+    start = time.perf_counter()
+    state = warm_cache.load(config)
+    if state is not None:
+        prayer_schedule.cache = state.schedule
+        audio_engine.set_assets(state.audio)
+        source = "loaded from the warm cache"
+    else:
+        audio_engine.set_assets(audio_engine.load(asset_paths(config)))
+        source = "computed"
+    prayer_schedule.refill(clock.now(local_timezone))
+    logger.info("Start-up state %s in %.1fms", source, (time.perf_counter() - start) * 1000)
 
-    logger.info("Starting scheduler")
+
+def warm(days: int):
+    start = time.perf_counter()
+    today = clock.now(local_timezone).date()
+    schedule = CompactSchedule.compute(prayer_calculator, today, days, config.latitude, config.longitude, local_timezone,
+                                       latitude_adjustment_method=config.latitude_adjustment_method)
+    audio = audio_engine.load(asset_paths(config))
+    warm_cache.write(config, schedule, audio)
+    logger.info("Warmed %s with %d days from %s in %.1fms", WARM_CACHE_DIR, days, today, (time.perf_counter() - start) * 1000)
+
+
+def memory_report():
+    global scheduler
+    tracker = MemoryTracker()
+    with tracker.step('startup state'):
+        load_startup_state()
+    with tracker.step('audio engine'):
+        audio_engine.start()
+    with tracker.step('scheduler'):
+        scheduler = create_scheduler(use_asyncio=False)
+        metrics.listen(scheduler)
+        scheduler.start(paused=True)
+    with tracker.step('prayer jobs'):
+        schedule_prayer_times()
+    print(tracker.format_report())
+    scheduler.shutdown()
+    audio_engine.close()
+
+
+def start_daemon(use_asyncio: bool):
+    global scheduler, panel, watchdog
+    load_startup_state()
+    audio_engine.start()
+
+    scheduler = create_scheduler(use_asyncio)
+    metrics.listen(scheduler)
+    metrics.info['mode'] = 'asyncio' if use_asyncio else 'threads'
+
+    try:
+        panel = AdhanPanel(lambda: call_in_daemon(stop_adhan))
+        panel.listen(scheduler)
+    except GPIOZeroError as e:
+        logger.warning("GPIO unavailable, running without button and LEDs: %s", e)
+
+    logger.info("Starting scheduler (%s mode)", metrics.info['mode'])
     scheduler.start()
     logger.info("Scheduler started")
 
     schedule_prayer_times()
 
-    # Cron job that runs every midnight and re compute the prayer times
-    job = scheduler.add_job(schedule_prayer_times, 'cron', hour=0, minute=0)
-    status_jobs['cron_recompute_prayer_times'] = job
+    scheduler.add_job(metrics.write_textfile, 'interval', seconds=METRICS_WRITE_INTERVAL_SECONDS, args=[METRICS_TEXTFILE])
+    scheduler.add_job(scheduler_status, 'interval', minutes=STATUS_INTERVAL_MINUTES)
+
+    # stops pinging systemd if the scheduler dies, triggers a restart when a check fails
+    watchdog = create_watchdog(notifier)
+    scheduler.add_job(watchdog.beat, 'interval', seconds=watchdog.interval, id='watchdog')
+    
+    config_watcher = ConfigWatcher(CONFIG_PATH, config, on_config_change)
+    config_watcher.start()
     
     logger.info("Piazan is running...")
+    notifier.ready()
 
     scheduler_status()
 
-    while True:
-        try:
-            pass
-        except Exception as e:
-            logger.error(f"Error: {e}")
-            scheduler.shutdown()
-            break
 
+def run_threaded():
+    start_daemon(use_asyncio=False)
 
-    
-    
+    # the scheduler runs in its own thread, the main thread only waits for a signal
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    notifier.stopping()
+    scheduler.shutdown()
+    audio_engine.close()
+
+
+async def run_asyncio():
+    global event_loop
+    event_loop = asyncio.get_running_loop()
+    start_daemon(use_asyncio=True)
+
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        event_loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+    notifier.stopping()
+    scheduler.shutdown()
+    audio_engine.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Adhan clock daemon")
+    parser.add_argument('--asyncio', action='store_true',
+                        help="run the jobs, GPIO callbacks and status on the event loop instead of the scheduler threads, audio keeps its output thread")
+    parser.add_argument('--log-format', choices=('json', 'text'), default='json')
+    subparsers = parser.add_subparsers(dest='command')
+    warm_parser = subparsers.add_parser('warm', help="precompute the schedule and decode the audio into the cache")
+    warm_parser.add_argument('--days', type=int, default=WARM_CACHE_DAYS)
+    subparsers.add_parser('memory-report', help="report the memory taken by each subsystem at steady state")
+    args = parser.parse_args()
+    if args.log_format == 'text':
+        std_handler.setFormatter(formatter)
 
+    if args.command == 'warm':
+        warm(args.days)
+    elif args.command == 'memory-report':
+        memory_report()
+    elif args.asyncio:
+        asyncio.run(run_asyncio())
+    else:
+        run_threaded()
@@ -2,5 +2,8 @@
 
 The original PHP library can be found here: https://1x.ax/islamic-network/libraries/prayer-times
 
-It should produce the exact same prayer times as it uses the same algorithms.
+It uses the same algorithms, except on nights crossing a DST transition where the night is
+measured in elapsed time rather than on the wall clock. It has not been checked against the
+PHP library: prayer_times/golden_data.json.gz is a snapshot generated from this port, see
+prayer_times.golden.
 """
\ No newline at end of file
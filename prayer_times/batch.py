@@ -0,0 +1,156 @@
+"""
+Batch prayer times calculation for many dates at once.
+"""
+
+import datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from prayer_times.prayer_times import PrayerTimes
+from prayer_times.dmath import ArrayDMath
+from prayer_times.timezone import utc_midnight, utc_offsets
+from prayer_times.contants import *
+
+
+# Minute of the day standing for a time that could not be computed
+INVALID_MINUTES = 0xFFFF
+
+# "HH:MM" of every minute of the day (24:00 included as rounding can reach it)
+_LABELS_24H = np.array(
+    [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(24 * 60 + 1)] + [INVALID_TIME], dtype=object
+)
+
+
+def format_minutes_of_day(minutes: np.ndarray) -> np.ndarray:
+    """Format minutes of the day as 24h "HH:MM" strings, INVALID_TIME for INVALID_MINUTES."""
+    index = np.where(minutes == INVALID_MINUTES, len(_LABELS_24H) - 1, minutes)
+    return _LABELS_24H[index.astype(np.intp)]
+
+
+class BatchPrayerTimes(PrayerTimes):
+    """Compute prayer times over a range of dates using the array math backend.
+
+    Runs the exact same calculation code as PrayerTimes, every time is a NumPy
+    array holding one value per date instead of a single float.
+    """
+
+    dmath = ArrayDMath
+
+    def __init__(self, *args, **kwargs):
+        """Initialize BatchPrayerTimes with method and settings."""
+        self.dates = []
+        self._local_julian_dates = None
+        self._gregorian_julian_dates = None
+        self._utc_midnights = None
+        super().__init__(*args, **kwargs)
+
+    def get_times_for_dates(self, dates: Iterable[datetime.datetime], latitude: float, longitude: float,
+                            elevation: Optional[float] = None,
+                            latitude_adjustment_method: str = LATITUDE_ADJUSTMENT_METHOD_ANGLE,
+                            midnight_mode: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Get prayer times in float hours for each of the given dates."""
+        self.dates = list(dates)
+        if not self.dates:
+            raise ValueError("At least one date is required")
+
+        self.longitude = float(longitude)
+        self._local_julian_dates = np.array([
+            self.julian_date(d.year, d.month, d.day) for d in self.dates
+        ]) - self.longitude / (15 * 24)
+        self._gregorian_julian_dates = np.array([self._gregorian_julian_date(d) for d in self.dates])
+        self._utc_midnights = np.array([utc_midnight(d) for d in self.dates])
+
+        return self.get_times(self.dates[0], latitude, longitude, elevation,
+                              latitude_adjustment_method, midnight_mode, TIME_FORMAT_FLOAT)
+
+    def get_times_for_locations(self, date: datetime.datetime, latitudes: np.ndarray, longitudes: np.ndarray,
+                                elevation: Optional[float] = None,
+                                latitude_adjustment_method: str = LATITUDE_ADJUSTMENT_METHOD_ANGLE,
+                                midnight_mode: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Get prayer times in float hours of a single date for each of the given locations.
+
+        The timezone of the date applies to every location, a naive date gives UTC times.
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        self.dates = [date]
+        self._local_julian_dates = self.julian_date(date.year, date.month, date.day) - longitudes / (15 * 24)
+        self._gregorian_julian_dates = self._gregorian_julian_date(date)
+        self._utc_midnights = utc_midnight(date)
+
+        self.latitude = latitudes
+        self.longitude = longitudes
+        self.elevation = 0 if elevation is None else float(elevation)
+        self.set_time_format(TIME_FORMAT_FLOAT)
+        self.set_latitude_adjustment_method(latitude_adjustment_method)
+        if midnight_mode is not None:
+            self.set_midnight_mode(midnight_mode)
+        self.date = date
+        return self.compute_times()
+
+    def get_unreachable_days(self) -> Dict[str, np.ndarray]:
+        """Get the days of the last batch on which the sun never reaches the angle of each time.
+
+        Found in the same pass as the times. Those times come from the night
+        portion of the latitude adjustment method, or are NaN without one when
+        sun angles are not clamped.
+        """
+        shape = np.shape(self._local_julian_dates)
+        return {prayer: np.broadcast_to(mask, shape) for prayer, mask in self.unreachable.items()}
+
+    def get_formatted_day(self, times: Dict[str, np.ndarray], index: int,
+                          format: str = TIME_FORMAT_24H) -> Dict[str, Union[str, float]]:
+        """Format the times of a single day of a batch result."""
+        self.date = self.dates[index]
+        self.set_time_format(format)
+        return {
+            prayer: self.get_formatted_time(float(values[index]), format, prayer)
+            for prayer, values in times.items()
+        }
+
+    def get_minutes_of_day(self, times: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Round a batch result to minutes of the day, INVALID_MINUTES where the time is NaN."""
+        minutes_of_day = {}
+        for prayer, values in times.items():
+            # same arithmetic as get_formatted_time
+            fix_time = self.dmath.fix_hour(values + 0.5 / 60)
+            hours = np.floor(fix_time)
+            minutes = np.floor((fix_time - hours) * 60)
+            minutes_of_day[prayer] = np.where(np.isnan(values), INVALID_MINUTES, hours * 60 + minutes).astype(np.uint16)
+        return minutes_of_day
+
+    def get_formatted_days(self, times: Dict[str, np.ndarray]) -> List[Dict[str, str]]:
+        """Format every day of a batch result in 24h format, with vectorized rounding."""
+        columns = {
+            prayer: format_minutes_of_day(minutes).tolist()
+            for prayer, minutes in self.get_minutes_of_day(times).items()
+        }
+        return [
+            {prayer: column[i] for prayer, column in columns.items()}
+            for i in range(len(self.dates))
+        ]
+
+    def modify_formats(self, times: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Batch results are kept as float arrays, see get_formatted_day."""
+        return times
+
+    def local_julian_date(self) -> np.ndarray:
+        """Julian dates of the batch at the observer's longitude."""
+        return self._local_julian_dates
+
+    def gregorian_to_julian_date(self) -> np.ndarray:
+        """Julian dates of the batch including the time of day."""
+        return self._gregorian_julian_dates
+
+    def timezone_offset(self, utc_time: np.ndarray) -> np.ndarray:
+        """Get the timezone offsets in hours at a time (in UTC hours) of every date of the batch."""
+        if not self.date.tzinfo:
+            return np.zeros_like(utc_time)
+        utc_time = np.where(np.isnan(utc_time), 12, utc_time)
+        return utc_offsets(self.date.tzinfo, self._utc_midnights + utc_time * 3600)
+
+    def _gregorian_julian_date(self, date: datetime.datetime) -> float:
+        """Convert a single Gregorian date to a Julian date."""
+        self.date = date
+        return PrayerTimes.gregorian_to_julian_date(self)
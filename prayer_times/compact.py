@@ -0,0 +1,142 @@
+"""
+Compact array backed storage of prayer times over many days.
+
+A day is a row of uint16 minutes of the day, one column per time, so a year
+of a location takes about 8 KB instead of hundreds of dicts of strings. A
+uint16 bitmask per day marks the times whose sun angle is never reached.
+Slicing by date returns views, the serialized form is the raw array behind a
+small header and loading it does not copy the data.
+"""
+
+import datetime
+import struct
+from typing import Dict, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from prayer_times.batch import BatchPrayerTimes, INVALID_MINUTES, format_minutes_of_day
+from prayer_times.contants import *
+
+# Times stored by default, in the order of the columns
+COMPACT_FIELDS = (IMSAK, FAJR, SUNRISE, ZHUHR, ASR, SUNSET, MAGHRIB, ISHA, MIDNIGHT, FIRST_THIRD, LAST_THIRD)
+
+_MAGIC = b'PTCS'
+_VERSION = 2
+# magic, version, first date as a proleptic Gregorian ordinal, days, header length
+_HEADER = struct.Struct('<4sHIIH')
+
+
+class CompactSchedule:
+    """Prayer times of consecutive days stored as a (days, fields) uint16 array."""
+
+    def __init__(self, first_date: datetime.date, minutes: np.ndarray,
+                 fields: Sequence[str] = COMPACT_FIELDS, unreachable: Optional[np.ndarray] = None):
+        """Wrap an array of minutes of the day starting at first_date, and the unreachable bitmask of each day."""
+        if minutes.ndim != 2 or minutes.shape[1] != len(fields):
+            raise ValueError(f"Expected a (days, {len(fields)}) array, got {minutes.shape}")
+        if len(fields) > 16:
+            raise ValueError(f"At most 16 fields fit the unreachable bitmask, got {len(fields)}")
+        self.first_date = first_date
+        self.minutes = minutes
+        self.fields = tuple(fields)
+        # bit i is set on the days the sun never reaches the angle of fields[i]
+        self.unreachable = np.zeros(len(minutes), dtype=np.uint16) if unreachable is None else unreachable
+        self._columns = {field: i for i, field in enumerate(self.fields)}
+
+    @classmethod
+    def compute(cls, prayer_times: BatchPrayerTimes, first_date: datetime.date, days: int,
+                latitude: float, longitude: float, tzinfo: Optional[datetime.tzinfo] = None,
+                elevation: Optional[float] = None,
+                latitude_adjustment_method: str = LATITUDE_ADJUSTMENT_METHOD_ANGLE,
+                fields: Sequence[str] = COMPACT_FIELDS) -> 'CompactSchedule':
+        """Compute the times of consecutive days with a single batch calculation."""
+        dates = [
+            datetime.datetime.combine(first_date + datetime.timedelta(days=i), datetime.time(0), tzinfo=tzinfo)
+            for i in range(days)
+        ]
+        times = prayer_times.get_times_for_dates(dates, latitude, longitude, elevation, latitude_adjustment_method)
+        minutes = prayer_times.get_minutes_of_day(times)
+        unreachable = np.zeros(days, dtype=np.uint16)
+        for i, field in enumerate(fields):
+            mask = prayer_times.get_unreachable_days().get(field)
+            if mask is not None:
+                unreachable |= mask.astype(np.uint16) << i
+        return cls(first_date, np.column_stack([minutes[field] for field in fields]), fields, unreachable)
+
+    @property
+    def last_date(self) -> datetime.date:
+        """Last day held, inclusive."""
+        return self.first_date + datetime.timedelta(days=len(self) - 1)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the times in bytes."""
+        return self.minutes.nbytes
+
+    def __len__(self) -> int:
+        """Number of days held."""
+        return self.minutes.shape[0]
+
+    def __contains__(self, date: datetime.date) -> bool:
+        """Check if a day is held."""
+        return 0 <= (date - self.first_date).days < len(self)
+
+    def __getitem__(self, key: Union[datetime.date, slice]) -> Union[Dict[str, str], 'CompactSchedule']:
+        """Get the times of a day as 24h strings, or a view over a slice of dates."""
+        if isinstance(key, slice):
+            return self.between(key.start or self.first_date, key.stop or self.last_date + datetime.timedelta(days=1))
+        return dict(zip(self.fields, format_minutes_of_day(self.minutes[self._row(key)]).tolist()))
+
+    def __iter__(self) -> Iterator[Tuple[datetime.date, Dict[str, str]]]:
+        """Iterate over the days and their times as 24h strings."""
+        labels = {field: format_minutes_of_day(self.minutes[:, i]).tolist() for i, field in enumerate(self.fields)}
+        for i in range(len(self)):
+            yield (self.first_date + datetime.timedelta(days=i),
+                   {field: column[i] for field, column in labels.items()})
+
+    def between(self, start: datetime.date, end: datetime.date) -> 'CompactSchedule':
+        """Get a view (no copy) of the days in [start, end)."""
+        i = max(0, (start - self.first_date).days)
+        j = min(len(self), (end - self.first_date).days)
+        return CompactSchedule(self.first_date + datetime.timedelta(days=i), self.minutes[i:max(i, j)], self.fields,
+                               self.unreachable[i:max(i, j)])
+
+    def column(self, field: str) -> np.ndarray:
+        """Get the minutes of the day of a time for every day, as a view."""
+        return self.minutes[:, self._columns[field]]
+
+    def minutes_of_day(self, date: datetime.date, field: str) -> Optional[int]:
+        """Get the minute of the day of a time, None if it is invalid."""
+        minutes = int(self.minutes[self._row(date), self._columns[field]])
+        return None if minutes == INVALID_MINUTES else minutes
+
+    def unreachable_fields(self, date: datetime.date) -> Tuple[str, ...]:
+        """Get the times of a day whose sun angle is never reached."""
+        bits = int(self.unreachable[self._row(date)])
+        return tuple(field for i, field in enumerate(self.fields) if bits >> i & 1)
+
+    def to_bytes(self) -> bytes:
+        """Serialize the schedule, the arrays are written through the buffer protocol."""
+        names = '\0'.join(self.fields).encode()
+        header = _HEADER.pack(_MAGIC, _VERSION, self.first_date.toordinal(), len(self), len(names))
+        return b''.join((header, names, memoryview(np.ascontiguousarray(self.minutes, dtype='<u2')),
+                         memoryview(np.ascontiguousarray(self.unreachable, dtype='<u2'))))
+
+    @classmethod
+    def from_buffer(cls, buffer) -> 'CompactSchedule':
+        """Load a serialized schedule, the arrays share the memory of the buffer."""
+        magic, version, ordinal, days, names_length = _HEADER.unpack_from(buffer)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Not a compact schedule or unsupported version")
+        names_end = _HEADER.size + names_length
+        fields = bytes(buffer[_HEADER.size:names_end]).decode().split('\0')
+        minutes = np.frombuffer(buffer, dtype='<u2', count=days * len(fields), offset=names_end)
+        unreachable = np.frombuffer(buffer, dtype='<u2', count=days, offset=names_end + minutes.nbytes)
+        return cls(datetime.date.fromordinal(ordinal), minutes.reshape(days, len(fields)), fields, unreachable)
+
+    def _row(self, date: datetime.date) -> int:
+        """Row of a day, raises KeyError when it is not held."""
+        i = (date - self.first_date).days
+        if not 0 <= i < len(self):
+            raise KeyError(date)
+        return i
@@ -0,0 +1,193 @@
+"""
+Prayer times of one place under several calculation methods at once.
+
+Methods only differ in the Imsak, Fajr, Maghrib and Isha angles or minute
+offsets, the Dhuhr offset and the midnight mode; the sun position, noon and
+Asr are the same for all of them. ``AllMethodsPrayerTimes`` runs the batch
+calculator once with arrays holding one value per method, and memoizes the
+sun position of each instant so it is computed once for every method.
+
+    python -m prayer_times.comparison LATITUDE LONGITUDE [--date YYYY-MM-DD] [--timezone ZONE] [--methods MWL,ISNA,...]
+
+prints the times of every method and the cost of the shared pass against
+one PrayerTimes call per method.
+"""
+
+import argparse
+import datetime
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Union
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from prayer_times.batch import BatchPrayerTimes
+from prayer_times.contants import *
+from prayer_times.method import Method
+from prayer_times.prayer_times import PrayerTimes
+
+# Methods compared by default, the custom method has no parameters of its own
+COMPARED_METHODS = tuple(code for code in Method.get_method_codes() if code != Method.METHOD_CUSTOM)
+
+FIELDS = (IMSAK, FAJR, SUNRISE, ZHUHR, ASR, SUNSET, MAGHRIB, ISHA, MIDNIGHT, FIRST_THIRD, LAST_THIRD)
+
+
+class AllMethodsPrayerTimes(BatchPrayerTimes):
+    """Compute the prayer times of a single date and place for several methods in one pass.
+
+    Every time is a NumPy array holding one value per method, in the order
+    of ``compared_methods``.
+    """
+
+    def __init__(self, methods: Sequence[str] = COMPARED_METHODS, school=SCHOOL_STANDARD, asr_shadow_factor=None):
+        """Initialize the calculator with the methods to compare."""
+        self.compared_methods = list(methods)
+        self._sun_positions: Dict[float, Dict[str, float]] = {}
+        super().__init__(methods[0], school, asr_shadow_factor)
+
+    def load_settings(self):
+        """Load the settings of every compared method as arrays, minute offsets are flagged."""
+        params = [self.methods[method].get('params', {}) for method in self.compared_methods]
+        defaults = {IMSAK: '10 min', FAJR: 0, ZHUHR: '0 min', MAGHRIB: '0 min', ISHA: 0}
+
+        self.settings = type('Settings', (), {})()
+        self._minutes = {}
+        for prayer, default in defaults.items():
+            values = [method_params.get(prayer, default) for method_params in params]
+            setattr(self.settings, prayer, np.array([PrayerTimes.evaluate(self, value) for value in values]))
+            self._minutes[prayer] = np.array([PrayerTimes.is_min(self, value) for value in values])
+        self._jafari = np.array([method_params.get(MIDNIGHT) == MIDNIGHT_MODE_JAFARI for method_params in params])
+        self.midnight_mode = MIDNIGHT_MODE_STANDARD
+
+    def get_times_for_methods(self, date: datetime.datetime, latitude: float, longitude: float,
+                              elevation: Optional[float] = None,
+                              latitude_adjustment_method: str = LATITUDE_ADJUSTMENT_METHOD_ANGLE) -> Dict[str, np.ndarray]:
+        """Get prayer times in float hours of every compared method."""
+        self._sun_positions = {}
+        return self.get_times_for_locations(date, latitude, longitude, elevation, latitude_adjustment_method)
+
+    def get_times_table(self, times: Dict[str, np.ndarray],
+                        format: str = TIME_FORMAT_24H) -> Dict[str, Dict[str, Union[str, float]]]:
+        """Format a result per method."""
+        self.set_time_format(format)
+        return {
+            method: {prayer: self.get_formatted_time(float(values[i]), format, prayer) for prayer, values in times.items()}
+            for i, method in enumerate(self.compared_methods)
+        }
+
+    def compute_times(self):
+        """Compute all prayer times, with the midnight mode of each method."""
+        times = {IMSAK: 5, FAJR: 5, SUNRISE: 6, ZHUHR: 12, ASR: 13, SUNSET: 18, MAGHRIB: 18, ISHA: 18}
+        times = self.compute_prayer_times(times)
+        times = self.adjust_times(times)
+
+        diff = self.time_diff(times[SUNSET], np.where(self._jafari, times[FAJR], times[SUNRISE]))
+        times[MIDNIGHT] = times[SUNSET] + diff / 2
+        times[FIRST_THIRD] = times[SUNSET] + diff / 3
+        times[LAST_THIRD] = times[SUNSET] + 2 * (diff / 3)
+        times = self.local_times(times)
+
+        # sunrise, noon, Asr and sunset are computed once for all the methods
+        times = {prayer: np.broadcast_to(values, self._jafari.shape).copy() for prayer, values in times.items()}
+        return self.tune_times(times)
+
+    def adjust_times(self, times: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Adjust times, minute offsets only apply to the methods that use them."""
+        times = super().adjust_times(times)
+        times[IMSAK] = np.where(self._minutes[IMSAK], times[FAJR] - self.settings.Imsak / 60, times[IMSAK])
+        times[MAGHRIB] = np.where(self._minutes[MAGHRIB], times[SUNSET] + self.settings.Maghrib / 60, times[MAGHRIB])
+        times[ISHA] = np.where(self._minutes[ISHA], times[MAGHRIB] + self.settings.Isha / 60, times[ISHA])
+        return times
+
+    def evaluate(self, value: Union[str, float, np.ndarray]) -> Union[float, np.ndarray]:
+        """Evaluate a setting, the settings of the compared methods are already evaluated."""
+        if isinstance(value, np.ndarray):
+            return value
+        return super().evaluate(value)
+
+    def is_min(self, value: Union[str, float, np.ndarray]) -> bool:
+        """Minute offsets are applied per method by adjust_times."""
+        if isinstance(value, np.ndarray):
+            return False
+        return super().is_min(value)
+
+    def sun_position(self, julian_date: float) -> Dict[str, float]:
+        """Calculate the sun position once per instant of the current day."""
+        key = float(julian_date)
+        position = self._sun_positions.get(key)
+        if position is None:
+            position = self._sun_positions[key] = super().sun_position(julian_date)
+        return position
+
+
+def compute_all_methods(date: datetime.datetime, latitude: float, longitude: float,
+                        methods: Sequence[str] = COMPARED_METHODS, elevation: Optional[float] = None,
+                        latitude_adjustment_method: str = LATITUDE_ADJUSTMENT_METHOD_ANGLE,
+                        format: str = TIME_FORMAT_24H) -> Dict[str, Dict[str, Union[str, float]]]:
+    """Get the prayer times of a date and place under each method, as method: prayer: time."""
+    prayer_times = AllMethodsPrayerTimes(methods)
+    times = prayer_times.get_times_for_methods(date, latitude, longitude, elevation, latitude_adjustment_method)
+    return prayer_times.get_times_table(times, format)
+
+
+def compute_each_method(date: datetime.datetime, latitude: float, longitude: float,
+                        methods: Sequence[str] = COMPARED_METHODS, elevation: Optional[float] = None,
+                        latitude_adjustment_method: str = LATITUDE_ADJUSTMENT_METHOD_ANGLE,
+                        format: str = TIME_FORMAT_24H) -> Dict[str, Dict[str, Union[str, float]]]:
+    """Same as compute_all_methods with one PrayerTimes call per method."""
+    return {
+        method: PrayerTimes(method).get_times(date, latitude, longitude, elevation, latitude_adjustment_method,
+                                              format=format)
+        for method in methods
+    }
+
+
+def format_table(table: Dict[str, Dict[str, Union[str, float]]]) -> str:
+    """Format a result per method as a text table, one method per line."""
+    lines = [f"{'Method':<14}" + "".join(f"{prayer:>11}" for prayer in FIELDS)]
+    for method, times in table.items():
+        lines.append(f"{method:<14}" + "".join(f"{times[prayer]:>11}" for prayer in FIELDS))
+    return "\n".join(lines)
+
+
+def _best_of(function, repeat: int = 5, number: int = 20) -> float:
+    """Best mean duration in seconds of a call."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('latitude', type=float)
+    parser.add_argument('longitude', type=float)
+    parser.add_argument('--date', type=datetime.date.fromisoformat, default=datetime.date.today())
+    parser.add_argument('--timezone', default='UTC', help="IANA timezone of the times")
+    parser.add_argument('--methods', default=','.join(COMPARED_METHODS), help="comma separated method codes")
+    args = parser.parse_args(argv)
+
+    methods = args.methods.split(',')
+    date = datetime.datetime(args.date.year, args.date.month, args.date.day, tzinfo=ZoneInfo(args.timezone))
+    table = compute_all_methods(date, args.latitude, args.longitude, methods)
+    print(format_table(table))
+
+    shared = _best_of(lambda: compute_all_methods(date, args.latitude, args.longitude, methods, format=TIME_FORMAT_FLOAT))
+    separate = _best_of(lambda: compute_each_method(date, args.latitude, args.longitude, methods,
+                                                    format=TIME_FORMAT_FLOAT))
+    print(f"\n{len(methods)} methods: shared pass {shared * 1000:.2f}ms, "
+          f"separate calls {separate * 1000:.2f}ms ({separate / shared:.1f}x)")
+
+    # both paths must agree to the minute
+    if table != compute_each_method(date, args.latitude, args.longitude, methods):
+        print("The shared pass differs from separate calls")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,75 +1,193 @@
 """
 Mathematical utility functions for prayer times calculations.
+
+``DMath`` works on plain floats and inlines the degree/radian conversions so
+every trig call costs a single Python frame. ``ArrayDMath`` exposes the same
+functions on top of NumPy so they accept arrays of angles, which lets the
+batch calculator share the calculation code of ``PrayerTimes``.
 """
 
 import math
 
+import numpy as np
+
+_PI = math.pi
+_sin = math.sin
+_cos = math.cos
+_tan = math.tan
+_asin = math.asin
+_acos = math.acos
+_atan = math.atan
+_atan2 = math.atan2
+_isnan = math.isnan
+
 
 class DMath:
     """Mathematical utility class for prayer times calculations."""
-    
+
     @staticmethod
     def dtr(d):
         """Convert degrees to radians."""
-        return (d * math.pi) / 180.0
-    
+        return (d * _PI) / 180.0
+
     @staticmethod
     def rtd(r):
         """Convert radians to degrees."""
-        return (r * 180.0) / math.pi
-    
+        return (r * 180.0) / _PI
+
     @staticmethod
     def sin(d):
         """Sine function with degrees input."""
-        return math.sin(DMath.dtr(d))
-    
+        return _sin((d * _PI) / 180.0)
+
     @staticmethod
     def cos(d):
         """Cosine function with degrees input."""
-        return math.cos(DMath.dtr(d))
-    
+        return _cos((d * _PI) / 180.0)
+
     @staticmethod
     def tan(d):
         """Tangent function with degrees input."""
-        return math.tan(DMath.dtr(d))
-    
+        return _tan((d * _PI) / 180.0)
+
     @staticmethod
     def arcsin(d):
         """Arcsine function returning degrees."""
-        return DMath.rtd(math.asin(d))
-    
+        return (_asin(d) * 180.0) / _PI
+
     @staticmethod
     def arccos(d):
         """Arccosine function returning degrees."""
-        return DMath.rtd(math.acos(d))
-    
+        return (_acos(d) * 180.0) / _PI
+
     @staticmethod
     def arctan(d):
         """Arctangent function returning degrees."""
-        return DMath.rtd(math.atan(d))
-    
+        return (_atan(d) * 180.0) / _PI
+
     @staticmethod
     def arccot(x):
         """Arccotangent function returning degrees."""
-        return DMath.rtd(math.atan(1/x))
-    
+        return (_atan(1/x) * 180.0) / _PI
+
     @staticmethod
     def arctan2(y, x):
         """Arctangent2 function returning degrees."""
-        return DMath.rtd(math.atan2(y, x))
-    
+        return (_atan2(y, x) * 180.0) / _PI
+
     @staticmethod
     def fix_angle(a):
         """Fix angle to 0-360 range."""
-        return DMath.fix(a, 360)
-    
+        a = a - 360 * (a // 360)
+        return a + 360 if a < 0 else a
+
     @staticmethod
     def fix_hour(a):
         """Fix hour to 0-24 range."""
-        return DMath.fix(a, 24)
-    
+        a = a - 24 * (a // 24)
+        return a + 24 if a < 0 else a
+
     @staticmethod
     def fix(a, b):
         """Fix a value to 0-b range."""
         a = a - b * (a // b)
-        return a + b if a < 0 else a 
\ No newline at end of file
+        return a + b if a < 0 else a
+
+    @staticmethod
+    def clip(a, low, high):
+        """Clamp a value to the [low, high] range."""
+        return max(low, min(high, a))
+
+    @staticmethod
+    def isnan(a):
+        """Check if a value is NaN."""
+        return _isnan(a)
+
+    @staticmethod
+    def where(condition, a, b):
+        """Return a if the condition holds, b otherwise."""
+        return a if condition else b
+
+
+class ArrayDMath(DMath):
+    """Array backend of DMath, every function accepts NumPy arrays."""
+
+    @staticmethod
+    def dtr(d):
+        """Convert degrees to radians."""
+        return np.deg2rad(d)
+
+    @staticmethod
+    def rtd(r):
+        """Convert radians to degrees."""
+        return np.rad2deg(r)
+
+    @staticmethod
+    def sin(d):
+        """Sine function with degrees input."""
+        return np.sin(np.deg2rad(d))
+
+    @staticmethod
+    def cos(d):
+        """Cosine function with degrees input."""
+        return np.cos(np.deg2rad(d))
+
+    @staticmethod
+    def tan(d):
+        """Tangent function with degrees input."""
+        return np.tan(np.deg2rad(d))
+
+    @staticmethod
+    def arcsin(d):
+        """Arcsine function returning degrees."""
+        return np.rad2deg(np.arcsin(d))
+
+    @staticmethod
+    def arccos(d):
+        """Arccosine function returning degrees."""
+        return np.rad2deg(np.arccos(d))
+
+    @staticmethod
+    def arctan(d):
+        """Arctangent function returning degrees."""
+        return np.rad2deg(np.arctan(d))
+
+    @staticmethod
+    def arccot(x):
+        """Arccotangent function returning degrees."""
+        return np.rad2deg(np.arctan(1/x))
+
+    @staticmethod
+    def arctan2(y, x):
+        """Arctangent2 function returning degrees."""
+        return np.rad2deg(np.arctan2(y, x))
+
+    @staticmethod
+    def fix_angle(a):
+        """Fix angle to 0-360 range."""
+        return ArrayDMath.fix(a, 360)
+
+    @staticmethod
+    def fix_hour(a):
+        """Fix hour to 0-24 range."""
+        return ArrayDMath.fix(a, 24)
+
+    @staticmethod
+    def fix(a, b):
+        """Fix a value to 0-b range."""
+        return np.mod(a, b)
+
+    @staticmethod
+    def clip(a, low, high):
+        """Clamp a value to the [low, high] range."""
+        return np.clip(a, low, high)
+
+    @staticmethod
+    def isnan(a):
+        """Check if a value is NaN."""
+        return np.isnan(a)
+
+    @staticmethod
+    def where(condition, a, b):
+        """Return a where the condition holds, b otherwise."""
+        return np.where(condition, a, b)
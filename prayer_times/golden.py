@@ -0,0 +1,306 @@
+"""
+Golden data regression harness.
+
+Compares computed prayer times against a stored reference dataset covering
+every method, school and latitude adjustment method over a set of cities
+(including high latitude ones) and dates (including DST transitions), and
+reports per field how many minutes the times drift. The night times of
+nights crossing a DST transition are also checked against the elapsed time
+between sunset and the next sunrise, which does not depend on the dataset,
+both as displayed and as the instants a PrayerSchedule alerts at.
+
+The reference rows are plain 24h "HH:MM" times keyed by case, so a dataset
+produced by the upstream PHP library can be dropped in place of the one
+generated from this port. The stored dataset is a snapshot generated from this
+port, the upstream library was not available to produce one: it pins the
+current results so that optimizations cannot drift silently, it does not show
+that they match upstream. The days whose night crosses a DST transition differ
+on purpose from upstream (the night is measured in elapsed time, not on the
+wall clock), they are listed in the dataset and their differences are reported
+apart, the DST night check covers them.
+
+    python -m prayer_times.golden check [--calculator scalar|batch] [--tolerance MINUTES]
+    python -m prayer_times.golden generate
+"""
+
+import argparse
+import datetime
+import gzip
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from prayer_times.batch import BatchPrayerTimes
+from prayer_times.contants import *
+from prayer_times.method import Method
+from prayer_times.prayer_times import PrayerTimes
+from prayer_times.schedule import PrayerSchedule, SCHEDULED_PRAYERS
+
+GOLDEN_DATA_PATH = os.path.join(os.path.dirname(__file__), 'golden_data.json.gz')
+GOLDEN_DATA_SOURCE = "snapshot generated by this port with 'python -m prayer_times.golden generate', not by the upstream PHP library"
+
+FIELDS = (IMSAK, FAJR, SUNRISE, ZHUHR, ASR, SUNSET, MAGHRIB, ISHA, MIDNIGHT, FIRST_THIRD, LAST_THIRD)
+
+# name: (latitude, longitude, timezone)
+CITIES = {
+    'Laval': (45.583729, -73.750069, 'America/Toronto'),
+    'Toronto': (43.653226, -79.383184, 'America/Toronto'),
+    'Makkah': (21.389082, 39.857912, 'Asia/Riyadh'),
+    'Cairo': (30.044420, 31.235712, 'Africa/Cairo'),
+    'London': (51.507351, -0.127758, 'Europe/London'),
+    'Jakarta': (-6.208763, 106.845599, 'Asia/Jakarta'),
+    'Sydney': (-33.868820, 151.209296, 'Australia/Sydney'),
+    'Oslo': (59.913869, 10.752245, 'Europe/Oslo'),
+    'Helsinki': (60.169856, 24.938379, 'Europe/Helsinki'),
+    'Anchorage': (61.218056, -149.900278, 'America/Anchorage'),
+    'Reykjavik': (64.146582, -21.942635, 'Atlantic/Reykjavik'),
+    'Tromso': (69.649205, 18.955324, 'Europe/Oslo'),
+}
+
+SCHOOLS = (SCHOOL_STANDARD, SCHOOL_HANAFI)
+
+LATITUDE_ADJUSTMENT_METHODS = (
+    LATITUDE_ADJUSTMENT_METHOD_ANGLE,
+    LATITUDE_ADJUSTMENT_METHOD_MOTN,
+    LATITUDE_ADJUSTMENT_METHOD_ONESEVENTH,
+    LATITUDE_ADJUSTMENT_METHOD_NONE,
+)
+
+
+def golden_dates() -> List[datetime.date]:
+    """Dates of the dataset: twice a month, solstices, equinoxes and DST transitions."""
+    dates = {datetime.date(2025, month, day) for month in range(1, 13) for day in (1, 15)}
+    dates |= {datetime.date(2025, 3, 20), datetime.date(2025, 6, 21),
+              datetime.date(2025, 9, 22), datetime.date(2025, 12, 21)}
+    # North America (March 9, November 2) and Europe (March 30, October 26)
+    for transition in (datetime.date(2025, 3, 9), datetime.date(2025, 11, 2),
+                       datetime.date(2025, 3, 30), datetime.date(2025, 10, 26)):
+        dates |= {transition + datetime.timedelta(days=delta) for delta in (-1, 0, 1)}
+    return sorted(dates)
+
+
+# Nights crossing a DST transition, spring forward and fall back, as (city, date of the evening)
+DST_NIGHTS = tuple(
+    (city, date)
+    for city in ('Toronto', 'Laval')
+    for date in (datetime.date(2025, 3, 8), datetime.date(2025, 3, 9),
+                 datetime.date(2025, 11, 1), datetime.date(2025, 11, 2))
+) + tuple(
+    (city, date)
+    for city in ('London', 'Oslo')
+    for date in (datetime.date(2025, 3, 29), datetime.date(2025, 3, 30),
+                 datetime.date(2025, 10, 25), datetime.date(2025, 10, 26))
+)
+
+# Parts of the night from sunset to the next sunrise, or Fajr in the Jafari mode
+NIGHT_PORTIONS = {MIDNIGHT: 1 / 2, FIRST_THIRD: 1 / 3, LAST_THIRD: 2 / 3}
+
+
+def divergent_days() -> Set[Tuple[str, datetime.date]]:
+    """(city, date) of the dataset whose night crosses a DST transition of the city, or starts on its day."""
+    days = set()
+    for city, (_, _, timezone) in CITIES.items():
+        zone = ZoneInfo(timezone)
+        for date in golden_dates():
+            # the offset changes between the start of the day and the end of the next night
+            start = datetime.datetime(date.year, date.month, date.day, tzinfo=zone)
+            end = (start + datetime.timedelta(days=2)).replace(tzinfo=zone)
+            if start.utcoffset() != end.utcoffset():
+                days.add((city, date))
+    return days
+
+
+def golden_groups():
+    """Iterate over (method, school, latitude adjustment method, city) of the dataset."""
+    methods = [code for code in Method.get_method_codes() if code != Method.METHOD_CUSTOM]
+    return itertools.product(methods, SCHOOLS, LATITUDE_ADJUSTMENT_METHODS, CITIES)
+
+
+def case_key(method: str, school: str, latitude_adjustment_method: str, city: str, date: datetime.date) -> str:
+    """Key of a case in the dataset."""
+    return f"{method}|{school}|{latitude_adjustment_method}|{city}|{date.isoformat()}"
+
+
+def compute_cases(calculator: str = 'batch') -> Dict[str, List[str]]:
+    """Compute the times of every case of the dataset as 24h strings."""
+    dates = golden_dates()
+    results = {}
+    for method, school, latitude_adjustment_method, city in golden_groups():
+        latitude, longitude, timezone = CITIES[city]
+        zone = ZoneInfo(timezone)
+        day_dates = [datetime.datetime(d.year, d.month, d.day, tzinfo=zone) for d in dates]
+
+        if calculator == 'batch':
+            pt = BatchPrayerTimes(method=method, school=school)
+            times = pt.get_times_for_dates(day_dates, latitude, longitude,
+                                           latitude_adjustment_method=latitude_adjustment_method)
+            days = pt.get_formatted_days(times)
+        else:
+            pt = PrayerTimes(method=method, school=school)
+            days = [pt.get_times(d, latitude, longitude, latitude_adjustment_method=latitude_adjustment_method)
+                    for d in day_dates]
+
+        for date, day in zip(dates, days):
+            results[case_key(method, school, latitude_adjustment_method, city, date)] = [day[f] for f in FIELDS]
+    return results
+
+
+def load_golden_data(path: str = GOLDEN_DATA_PATH) -> Dict[str, List[str]]:
+    """Load the reference dataset."""
+    with gzip.open(path, 'rt') as f:
+        data = json.load(f)
+    return {key: row.split(' ') for key, row in zip(data['cases'], data['times'])}
+
+
+def save_golden_data(cases: Dict[str, List[str]], path: str = GOLDEN_DATA_PATH):
+    """Store a reference dataset generated from this port."""
+    keys = sorted(cases)
+    divergent = [f"{city}|{date.isoformat()}" for city, date in sorted(divergent_days())]
+    data = {'source': GOLDEN_DATA_SOURCE, 'divergent_days': divergent,
+            'fields': list(FIELDS), 'cases': keys, 'times': [' '.join(cases[key]) for key in keys]}
+    with gzip.GzipFile(path, 'wb', mtime=0) as f:
+        f.write(json.dumps(data, separators=(',', ':')).encode())
+
+
+def minutes_delta(expected: str, actual: str) -> Optional[int]:
+    """Signed difference in minutes between two 24h times, None if either is invalid."""
+    if expected == INVALID_TIME or actual == INVALID_TIME:
+        return 0 if expected == actual else None
+    expected_hours, expected_minutes = expected.split(':')
+    actual_hours, actual_minutes = actual.split(':')
+    delta = (int(actual_hours) * 60 + int(actual_minutes)) - (int(expected_hours) * 60 + int(expected_minutes))
+    # wrap around midnight
+    return (delta + 720) % 1440 - 720
+
+
+def compare(expected: Dict[str, List[str]], actual: Dict[str, List[str]]) -> Dict[str, Dict[str, int]]:
+    """Per field statistics of the minute deltas between two datasets, the DST divergent days apart."""
+    report = {field: {'cases': 0, 'different': 0, 'invalid': 0, 'max_delta': 0, 'divergent': 0} for field in FIELDS}
+    divergent = {f"{city}|{date.isoformat()}" for city, date in divergent_days()}
+    for key, expected_row in expected.items():
+        actual_row = actual.get(key)
+        city, date = key.split('|')[3:]
+        for i, field in enumerate(FIELDS):
+            stats = report[field]
+            stats['cases'] += 1
+            delta = None if actual_row is None else minutes_delta(expected_row[i], actual_row[i])
+            if delta and f"{city}|{date}" in divergent:
+                stats['divergent'] += 1
+            elif delta is None:
+                stats['invalid'] += 1
+            elif delta:
+                stats['different'] += 1
+                stats['max_delta'] = max(stats['max_delta'], abs(delta))
+    return report
+
+
+def format_report(report: Dict[str, Dict[str, int]]) -> str:
+    """Format the comparison as a table."""
+    lines = [f"{'Field':<12}{'Cases':>8}{'Different':>11}{'Invalid':>9}{'Max delta (min)':>17}{'DST divergent':>15}"]
+    for field, stats in report.items():
+        lines.append(f"{field:<12}{stats['cases']:>8}{stats['different']:>11}"
+                     f"{stats['invalid']:>9}{stats['max_delta']:>17}{stats['divergent']:>15}")
+    return "\n".join(lines)
+
+
+def check(calculator: str = 'batch', tolerance: int = 0, path: str = GOLDEN_DATA_PATH) -> Tuple[bool, str]:
+    """Compare the current code with the reference, return (passed, report)."""
+    expected = load_golden_data(path)
+    start = time.perf_counter()
+    actual = compute_cases(calculator)
+    elapsed = time.perf_counter() - start
+    report = compare(expected, actual)
+    passed = all(stats['invalid'] == 0 and stats['max_delta'] <= tolerance for stats in report.values())
+    summary = f"{len(expected)} cases computed with the {calculator} calculator in {elapsed:.2f}s"
+    return passed, format_report(report) + "\n" + summary
+
+
+def wall_timestamp(date: datetime.date, time_24h: str, zone: datetime.tzinfo) -> float:
+    """POSIX timestamp of a 24h time of a date, for times which are not repeated by a transition."""
+    hours, minutes = time_24h.split(':')
+    return datetime.datetime.combine(date, datetime.time(int(hours), int(minutes)), tzinfo=zone).timestamp()
+
+
+def expected_night(day: Dict[str, str], date: datetime.date, zone: datetime.tzinfo,
+                   jafari: bool = False) -> Dict[str, float]:
+    """Timestamps of the night times of a day, from the elapsed time between sunset and the next morning."""
+    sunset = wall_timestamp(date, day[SUNSET], zone)
+    # the next morning is taken a day, not a wall clock day, after the morning of the date
+    morning = wall_timestamp(date, day[FAJR if jafari else SUNRISE], zone) + 86400
+    return {prayer: sunset + (morning - sunset) * portion for prayer, portion in NIGHT_PORTIONS.items()}
+
+
+def check_dst_nights(calculator: str = 'batch', methods=(Method.METHOD_ISNA, Method.METHOD_JAFARI)) -> Tuple[bool, str]:
+    """Check the night times and their scheduled instants on nights crossing a DST transition."""
+    failures = []
+    checked = 0
+    for method, (city, date) in itertools.product(methods, DST_NIGHTS):
+        latitude, longitude, timezone = CITIES[city]
+        zone = ZoneInfo(timezone)
+        midnight = datetime.datetime(date.year, date.month, date.day, tzinfo=zone)
+        if calculator == 'batch':
+            pt = BatchPrayerTimes(method=method)
+            day = pt.get_formatted_day(pt.get_times_for_dates([midnight], latitude, longitude), 0)
+        else:
+            pt = PrayerTimes(method=method)
+            day = pt.get_times(midnight, latitude, longitude)
+        expected = expected_night(day, date, zone, pt.midnight_mode == MIDNIGHT_MODE_JAFARI)
+
+        # the night times as displayed, a repeated wall time matches either of its instants
+        for prayer, timestamp in expected.items():
+            expected_time = datetime.datetime.fromtimestamp(timestamp, zone).strftime('%H:%M')
+            delta = minutes_delta(expected_time, day[prayer])
+            checked += 1
+            if delta is None or abs(delta) > 1:
+                failures.append(f"{method} {city} {date} {prayer}: {day[prayer]}, expected {expected_time}")
+
+        # the instants the daemon schedules the night alerts at
+        schedule = PrayerSchedule(BatchPrayerTimes(method=method), latitude, longitude, zone, days=2,
+                                  prayers=SCHEDULED_PRAYERS + (MIDNIGHT, LAST_THIRD))
+        sunset = wall_timestamp(date, day[SUNSET], zone)
+        scheduled = {}
+        for prayer in schedule.prayers_between(midnight, midnight + datetime.timedelta(days=2)):
+            if prayer.time.timestamp() > sunset:
+                scheduled.setdefault(prayer.name, prayer.time)
+        for prayer in (MIDNIGHT, LAST_THIRD):
+            checked += 1
+            instant = scheduled.get(prayer)
+            if instant is None or abs(instant.timestamp() - expected[prayer]) > 60:
+                failures.append(f"{method} {city} {date} {prayer} scheduled at "
+                                f"{instant.isoformat() if instant else None}, expected "
+                                f"{datetime.datetime.fromtimestamp(expected[prayer], zone).isoformat()}")
+
+    report = [f"{checked} night times checked on {len(DST_NIGHTS)} DST transition nights, {len(failures)} wrong"]
+    return not failures, "\n".join(report + failures)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check_parser = subparsers.add_parser('check', help="compare against the reference dataset")
+    check_parser.add_argument('--calculator', choices=('batch', 'scalar'), default='batch')
+    check_parser.add_argument('--tolerance', type=int, default=0, help="allowed drift in minutes")
+    check_parser.add_argument('--data', default=GOLDEN_DATA_PATH)
+    generate_parser = subparsers.add_parser('generate', help="rewrite the reference from the current code")
+    generate_parser.add_argument('--data', default=GOLDEN_DATA_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        cases = compute_cases('scalar')
+        save_golden_data(cases, args.data)
+        print(f"Wrote {len(cases)} cases to {args.data}")
+        return 0
+
+    passed, report = check(args.calculator, args.tolerance, args.data)
+    print(report)
+    dst_passed, dst_report = check_dst_nights(args.calculator)
+    print(dst_report)
+    return 0 if passed and dst_passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Prayer times of many nearby locations interpolated from a coarse grid.
+
+Times are computed once per day at the corners of the grid cells holding
+the sites, in UTC, and bilinearly interpolated inside each cell; the offset
+of the timezone of each site is added afterwards. Every cell is checked at
+its center against an exact computation, cells whose error exceeds a quarter
+of the tolerance, cells with invalid times, sites beyond ``max_latitude`` and
+timezones changing their offset that day are computed exactly instead.
+
+With the default 0.5° step the interpolation error stays under 10 seconds
+over a year, ``python -m prayer_times.grid check`` measures it against exact
+times and fails past the tolerance:
+
+    python -m prayer_times.grid check [--step DEGREES] [--sites N] [--tolerance SECONDS]
+"""
+
+import argparse
+import datetime
+import sys
+import time
+from typing import Dict, Sequence, Tuple, Union
+
+import numpy as np
+
+from prayer_times.batch import BatchPrayerTimes
+from prayer_times.contants import *
+from prayer_times.timezone import utc_midnight, utc_offsets
+
+
+def _grid_keys(rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    """Pack grid indices in single integers, sorted and compared faster than pairs."""
+    return (rows << 32) + columns
+
+
+def _grid_indices(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Unpack the grid indices of _grid_keys."""
+    columns = ((keys + (1 << 31)) & 0xFFFFFFFF) - (1 << 31)
+    return (keys - columns) >> 32, columns
+
+
+class GridPrayerTimes:
+    """Interpolate the times of a set of sites from the corners of their grid cells."""
+
+    def __init__(self, prayer_times: BatchPrayerTimes, step: float = 0.5,
+                 max_latitude: float = 60.0, tolerance: float = 30.0):
+        """Initialize the grid, the tolerance is in seconds."""
+        self.prayer_times = prayer_times
+        self.step = step
+        self.max_latitude = max_latitude
+        self.tolerance = tolerance
+        # sites, cells, computed locations and exactly computed sites of the last call
+        self.stats: Dict[str, int] = {}
+
+    def get_times_for_sites(self, date: datetime.date, latitudes: Sequence[float], longitudes: Sequence[float],
+                            timezones: Union[datetime.tzinfo, Sequence[datetime.tzinfo]],
+                            latitude_adjustment_method: str = LATITUDE_ADJUSTMENT_METHOD_ANGLE) -> Dict[str, np.ndarray]:
+        """Get the local times in float hours of every site on a date."""
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        if isinstance(timezones, datetime.tzinfo):
+            timezones = [timezones] * len(latitudes)
+        day = datetime.datetime(date.year, date.month, date.day)
+
+        # sites of each distinct zone, zones are compared by identity
+        zones = list({id(zone): zone for zone in timezones}.values())
+        zone_indices = {id(zone): index for index, zone in enumerate(zones)}
+        site_zones = np.array([zone_indices[id(zone)] for zone in timezones], dtype=np.intp)
+
+        exact = np.abs(latitudes) > self.max_latitude
+        # a zone changing its offset that day shifts part of the times only
+        day_start = utc_midnight(day)
+        zone_offsets = np.zeros(len(zones))
+        for index, zone in enumerate(zones):
+            offsets = utc_offsets(zone, np.array([day_start - 43200, day_start, day_start + 129600]))
+            zone_offsets[index] = offsets[1]
+            if offsets[0] != offsets[2]:
+                exact |= site_zones == index
+
+        rows = np.floor(latitudes / self.step).astype(np.int64)
+        columns = np.floor(longitudes / self.step).astype(np.int64)
+        cells, site_cells = np.unique(_grid_keys(rows, columns)[~exact], return_inverse=True)
+        if 2 * len(cells) >= len(site_cells):
+            # sparse sites, computing them is cheaper than computing the grid
+            exact[:] = True
+            cells = cells[:0]
+
+        times = {}
+        computed = 0
+        if len(cells):
+            # corners (0, 0), (1, 0), (0, 1), (1, 1) and center of every cell in half steps,
+            # neighbouring cells share their corners
+            cell_rows, cell_columns = _grid_indices(cells)
+            nodes, cell_nodes = np.unique(
+                _grid_keys(2 * cell_rows[:, None] + [0, 2, 0, 2, 1], 2 * cell_columns[:, None] + [0, 0, 2, 2, 1]),
+                return_inverse=True)
+            cell_nodes = cell_nodes.reshape(len(cells), 5)
+            node_rows, node_columns = _grid_indices(nodes)
+            node_times = self.prayer_times.get_times_for_locations(day, node_rows * self.step / 2,
+                                                                   node_columns * self.step / 2,
+                                                                   latitude_adjustment_method=latitude_adjustment_method)
+            node_times = {prayer: values[cell_nodes] for prayer, values in node_times.items()}
+            computed = len(nodes)
+
+            bad_cells = np.zeros(len(cells), dtype=bool)
+            for values in node_times.values():
+                center_error = np.abs(values[:, :4].mean(axis=1) - values[:, 4]) * 3600
+                bad_cells |= np.isnan(values).any(axis=1) | (center_error > self.tolerance / 4)
+
+            interpolated = np.flatnonzero(~exact)
+            bad_sites = bad_cells[site_cells]
+            exact[interpolated[bad_sites]] = True
+            interpolated = interpolated[~bad_sites]
+            site_cells = site_cells[~bad_sites]
+
+            u = latitudes[interpolated] / self.step - rows[interpolated]
+            v = longitudes[interpolated] / self.step - columns[interpolated]
+            weights = np.stack([(1 - u) * (1 - v), u * (1 - v), (1 - u) * v, u * v], axis=-1)
+            offsets = zone_offsets[site_zones[interpolated]]
+            for prayer, values in node_times.items():
+                times[prayer] = np.full(len(latitudes), np.nan)
+                times[prayer][interpolated] = (values[site_cells, :4] * weights).sum(axis=1) + offsets
+
+        for index in np.unique(site_zones[exact]):
+            sites = np.flatnonzero(exact & (site_zones == index))
+            zone_day = datetime.datetime(date.year, date.month, date.day, tzinfo=zones[index])
+            exact_times = self.prayer_times.get_times_for_locations(zone_day, latitudes[sites], longitudes[sites],
+                                                                    latitude_adjustment_method=latitude_adjustment_method)
+            for prayer, values in exact_times.items():
+                times.setdefault(prayer, np.full(len(latitudes), np.nan))[sites] = values
+            computed += len(sites)
+
+        self.stats = {'sites': len(latitudes), 'cells': len(cells), 'computed': computed, 'exact': int(exact.sum())}
+        return times
+
+
+# Centers of the clustered sites of the check, as (latitude, longitude)
+_CITIES = np.array([(45.58, -73.75), (51.51, -0.13), (30.04, 31.24), (-6.21, 106.85), (-33.87, 151.21),
+                    (21.39, 39.86), (59.91, 10.75), (40.71, -74.01)])
+
+
+def clustered_sites(count: int, seed: int = 0) -> np.ndarray:
+    """Sites scattered around cities, as (latitude, longitude)."""
+    rng = np.random.default_rng(seed)
+    return _CITIES[rng.integers(len(_CITIES), size=count)] + rng.normal(0, 0.5, size=(count, 2))
+
+
+def spread_sites(count: int, seed: int = 0) -> np.ndarray:
+    """Sites spread between the polar circles, as (latitude, longitude)."""
+    rng = np.random.default_rng(seed)
+    return np.stack([rng.uniform(-66, 66, count), rng.uniform(-180, 180, count)], axis=-1)
+
+
+def check(step: float, count: int, tolerance: float) -> bool:
+    """Compare the grid with exact times over a year, print the errors and timings."""
+    zone = datetime.timezone.utc
+    prayer_times = BatchPrayerTimes()
+    grid = GridPrayerTimes(BatchPrayerTimes(), step=step, tolerance=tolerance)
+    dates = [datetime.date(2025, 1, 1) + datetime.timedelta(days=day) for day in range(0, 365, 7)]
+    max_errors: Dict[str, float] = {}
+    # sites where only one of the grid and the exact times is invalid
+    nan_mismatches: Dict[str, int] = {}
+    for name, sites in (('clustered', clustered_sites(count)), ('spread', spread_sites(count))):
+        grid_seconds = exact_seconds = 0.0
+        computed = 0
+        for date in dates:
+            start = time.perf_counter()
+            times = grid.get_times_for_sites(date, sites[:, 0], sites[:, 1], zone)
+            grid_seconds += time.perf_counter() - start
+            computed += grid.stats['computed']
+            start = time.perf_counter()
+            expected = prayer_times.get_times_for_locations(
+                datetime.datetime(date.year, date.month, date.day, tzinfo=zone), sites[:, 0], sites[:, 1])
+            exact_seconds += time.perf_counter() - start
+            for prayer, values in expected.items():
+                mismatches = int((np.isnan(times[prayer]) != np.isnan(values)).sum())
+                nan_mismatches[prayer] = nan_mismatches.get(prayer, 0) + mismatches
+                errors = np.abs(times[prayer] - values)
+                error = np.nanmax(errors) * 3600 if not np.isnan(errors).all() else 0.0
+                max_errors[prayer] = max(max_errors.get(prayer, 0.0), error)
+        print(f"{count} {name} sites over {len(dates)} days: grid {grid_seconds:.3f}s, exact {exact_seconds:.3f}s, "
+              f"{computed // len(dates)} locations computed per day")
+
+    print(f"{'Time':<12}{'Max error':>10}{'Invalid mismatches':>20}")
+    for prayer, error in max_errors.items():
+        print(f"{prayer:<12}{error:>9.2f}s{nan_mismatches[prayer]:>20}")
+    return max(max_errors.values()) <= tolerance and not any(nan_mismatches.values())
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check_parser = subparsers.add_parser('check', help="measure the interpolation error against exact times")
+    check_parser.add_argument('--step', type=float, default=0.5)
+    check_parser.add_argument('--sites', type=int, default=20000)
+    check_parser.add_argument('--tolerance', type=float, default=30.0, help="allowed error in seconds")
+    args = parser.parse_args(argv)
+    return 0 if check(args.step, args.sites, args.tolerance) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Hijri calendar backed by a precomputed table of month starts.
+
+The table holds the Gregorian ordinal of the first day of every Hijri month
+of a range of years, so converting a date is a binary search and Hijri to
+Gregorian is an index. The default table is the tabular (arithmetic)
+calendar; local moon sighting is followed by shifting it by a few days, and
+a table of observed month starts can be passed instead.
+"""
+
+import datetime
+import functools
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+RAMADAN = 9
+SHAWWAL = 10
+
+MONTH_NAMES = (
+    'Muharram', 'Safar', "Rabi' al-Awwal", "Rabi' al-Thani", 'Jumada al-Ula', 'Jumada al-Akhirah',
+    'Rajab', "Sha'ban", 'Ramadan', 'Shawwal', "Dhu al-Qi'dah", 'Dhu al-Hijjah',
+)
+
+# Gregorian ordinal of the day before 1 Muharram 1 (July 16, 622 Julian)
+_EPOCH = 227014
+
+
+class HijriDate(NamedTuple):
+    """A day of the Hijri calendar."""
+    year: int
+    month: int
+    day: int
+
+    def __str__(self) -> str:
+        return f"{self.day} {MONTH_NAMES[self.month - 1]} {self.year}"
+
+
+def tabular_month_start(year: int, month: int) -> int:
+    """Gregorian ordinal of the first day of a month of the tabular Hijri calendar."""
+    return _EPOCH + (year - 1) * 354 + (3 + 11 * year) // 30 + 29 * (month - 1) + month // 2 + 1
+
+
+class HijriCalendar:
+    """Gregorian to Hijri conversions over a range of years."""
+
+    def __init__(self, first_year: int, month_starts: np.ndarray):
+        """Wrap the ordinals of the month starts from 1 Muharram first_year, plus the end of the last month."""
+        self.first_year = first_year
+        self.month_starts = month_starts
+        self.last_year = first_year + (len(month_starts) - 1) // 12 - 1
+
+    @classmethod
+    def tabular(cls, first_year: int = 1400, last_year: int = 1500, adjustment: int = 0) -> 'HijriCalendar':
+        """Build the table of the tabular calendar, shifted by adjustment days."""
+        month_starts = [
+            tabular_month_start(year, month)
+            for year in range(first_year, last_year + 1) for month in range(1, 13)
+        ]
+        month_starts.append(tabular_month_start(last_year + 1, 1))
+        return cls(first_year, np.array(month_starts, dtype=np.int64) + adjustment)
+
+    def to_hijri(self, date: datetime.date) -> HijriDate:
+        """Convert a Gregorian date, raises ValueError outside of the table."""
+        ordinal = date.toordinal()
+        i = int(np.searchsorted(self.month_starts, ordinal, side='right')) - 1
+        if i < 0 or i >= len(self.month_starts) - 1:
+            raise ValueError(f"{date} is outside of the Hijri years {self.first_year}-{self.last_year}")
+        year, month = divmod(i, 12)
+        return HijriDate(self.first_year + year, month + 1, ordinal - int(self.month_starts[i]) + 1)
+
+    def to_gregorian(self, date: HijriDate) -> datetime.date:
+        """Convert a Hijri date, raises ValueError outside of the table."""
+        i = (date.year - self.first_year) * 12 + date.month - 1
+        if not 0 <= i < len(self.month_starts) - 1 or not 1 <= date.day <= self.month_length(date.year, date.month):
+            raise ValueError(f"Invalid or out of range Hijri date {date}")
+        return datetime.date.fromordinal(int(self.month_starts[i]) + date.day - 1)
+
+    def month_length(self, year: int, month: int) -> int:
+        """Number of days of a Hijri month."""
+        i = (year - self.first_year) * 12 + month - 1
+        return int(self.month_starts[i + 1] - self.month_starts[i])
+
+    def month_range(self, year: int, month: int) -> Tuple[datetime.date, datetime.date]:
+        """First and last Gregorian days of a Hijri month."""
+        first = self.to_gregorian(HijriDate(year, month, 1))
+        return first, first + datetime.timedelta(days=self.month_length(year, month) - 1)
+
+    def is_ramadan(self, date: datetime.date) -> bool:
+        """Check if a day is in Ramadan."""
+        return self.to_hijri(date).month == RAMADAN
+
+    def next_ramadan(self, date: datetime.date) -> Optional[Tuple[datetime.date, datetime.date]]:
+        """First and last days of the current or next Ramadan, None past the table."""
+        hijri = self.to_hijri(date)
+        year = hijri.year if hijri.month <= RAMADAN else hijri.year + 1
+        if year > self.last_year:
+            return None
+        return self.month_range(year, RAMADAN)
+
+
+@functools.lru_cache(maxsize=8)
+def get_hijri_calendar(adjustment: int = 0) -> HijriCalendar:
+    """Get the shared tabular calendar of an adjustment, built once."""
+    return HijriCalendar.tabular(adjustment=adjustment)
@@ -0,0 +1,158 @@
+"""
+Pick the calculation method and timezone of arbitrary coordinates.
+
+The timezone comes from timezonefinder, loaded once, and gives the country
+(the inverse of ``pytz.country_timezones``). The method is the one used in
+that country (``COUNTRY_METHODS``, which a locator can be given its own of),
+the Muslim World League method elsewhere and at sea. A batch of sites is
+resolved with one timezone lookup per distinct coordinates, in a single call
+where timezonefinder has a batch API.
+
+The reference locations of the methods (``Method.get_methods()``) are kept as
+unit vectors, the distance from every site to the reference location of its
+method is a single row-wise dot product.
+"""
+
+import functools
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pytz
+from timezonefinder import TimezoneFinder
+
+from prayer_times.method import Method
+
+# Mean radius of the Earth, in kilometers
+EARTH_RADIUS_KM = 6371.0088
+
+# Method of the sites in a country without an entry in the table, or at sea
+FALLBACK_METHOD = Method.METHOD_MWL
+
+# ISO 3166 country code: method of the authority of the country
+COUNTRY_METHODS = {
+    'US': Method.METHOD_ISNA,
+    'CA': Method.METHOD_ISNA,
+    'EG': Method.METHOD_EGYPT,
+    'SD': Method.METHOD_EGYPT,
+    'LY': Method.METHOD_EGYPT,
+    'SY': Method.METHOD_EGYPT,
+    'LB': Method.METHOD_EGYPT,
+    'SA': Method.METHOD_MAKKAH,
+    'YE': Method.METHOD_MAKKAH,
+    'PK': Method.METHOD_KARACHI,
+    'IN': Method.METHOD_KARACHI,
+    'BD': Method.METHOD_KARACHI,
+    'AF': Method.METHOD_KARACHI,
+    'IR': Method.METHOD_TEHRAN,
+    'BH': Method.METHOD_GULF,
+    'OM': Method.METHOD_GULF,
+    'AE': Method.METHOD_DUBAI,
+    'KW': Method.METHOD_KUWAIT,
+    'QA': Method.METHOD_QATAR,
+    'SG': Method.METHOD_SINGAPORE,
+    'MY': Method.METHOD_JAKIM,
+    'ID': Method.METHOD_KEMENAG,
+    'FR': Method.METHOD_FRANCE,
+    'TR': Method.METHOD_TURKEY,
+    'RU': Method.METHOD_RUSSIA,
+    'TN': Method.METHOD_TUNISIA,
+    'DZ': Method.METHOD_ALGERIA,
+    'MA': Method.METHOD_MOROCCO,
+    'PT': Method.METHOD_PORTUGAL,
+    'JO': Method.METHOD_JORDAN,
+}
+
+# IANA timezone: country code, every zone of zone.tab belongs to a single country
+ZONE_COUNTRIES = {zone: country for country, zones in pytz.country_timezones.items() for zone in zones}
+
+
+class SiteSettings(NamedTuple):
+    """Calculation method and timezone picked for a site."""
+    method: str
+    timezone: Optional[str]
+    distance_km: float
+
+
+def _unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """Convert coordinates in degrees to (n, 3) unit vectors."""
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    cos_latitudes = np.cos(latitudes)
+    return np.stack([cos_latitudes * np.cos(longitudes), cos_latitudes * np.sin(longitudes), np.sin(latitudes)], axis=-1)
+
+
+class MethodLocator:
+    """Country table of the calculation methods and index of their reference locations."""
+
+    def __init__(self, country_methods: Optional[Dict[str, str]] = None):
+        """Build the index from the method registry, methods without a location get NaN distances."""
+        self.country_methods = COUNTRY_METHODS if country_methods is None else country_methods
+        unknown = set(self.country_methods.values()) - set(Method.get_method_codes())
+        if unknown:
+            raise ValueError(f"Unknown calculation methods {', '.join(sorted(unknown))}")
+        self.codes = Method.get_method_codes()
+        self._rows = {code: i for i, code in enumerate(self.codes)}
+        coordinates = []
+        for code in self.codes:
+            location = Method.get_methods()[code].get('location')
+            coordinates.append((location['latitude'], location['longitude']) if location else (np.nan, np.nan))
+        latitudes, longitudes = zip(*coordinates)
+        self._vectors = _unit_vectors(latitudes, longitudes)
+        self._timezone_finder: Optional[TimezoneFinder] = None
+
+    def method_of_timezone(self, timezone: Optional[str]) -> str:
+        """Get the method of the country of a timezone, or the fallback one."""
+        return self.country_methods.get(ZONE_COUNTRIES.get(timezone), FALLBACK_METHOD)
+
+    def distances(self, latitudes: Sequence[float], longitudes: Sequence[float], codes: Sequence[str]) -> np.ndarray:
+        """Get the great circle distance in km from every site to the reference location of its method."""
+        references = self._vectors[[self._rows[code] for code in codes]]
+        cosines = np.clip(np.sum(_unit_vectors(latitudes, longitudes) * references, axis=-1), -1.0, 1.0)
+        return np.arccos(cosines) * EARTH_RADIUS_KM
+
+    def method_at(self, latitude: float, longitude: float) -> str:
+        """Get the method of the country of coordinates, or the fallback one."""
+        return self.method_of_timezone(self.timezone_at(latitude, longitude))
+
+    def timezone_at(self, latitude: float, longitude: float) -> Optional[str]:
+        """Get the IANA timezone of coordinates, None at sea far from any land."""
+        return self._finder().timezone_at(lng=longitude, lat=latitude)
+
+    def timezones_at(self, latitudes: Sequence[float], longitudes: Sequence[float]) -> List[Optional[str]]:
+        """Get the IANA timezones of many coordinates, looking each distinct site up once."""
+        sites = np.stack([np.asarray(latitudes, dtype=float), np.asarray(longitudes, dtype=float)], axis=-1)
+        unique_sites, inverse = np.unique(sites, axis=0, return_inverse=True)
+        finder = self._finder()
+        # only the recent releases of timezonefinder have the batch lookup
+        timezone_names_at = getattr(finder, 'timezone_names_at', None)
+        if timezone_names_at is not None:
+            timezones = timezone_names_at(lngs=np.ascontiguousarray(unique_sites[:, 1]),
+                                          lats=np.ascontiguousarray(unique_sites[:, 0]))
+        else:
+            timezones = [finder.timezone_at(lng=longitude, lat=latitude) for latitude, longitude in unique_sites]
+        return [timezones[i] for i in inverse.reshape(-1)]
+
+    def resolve(self, sites: Sequence[Tuple[float, float]]) -> List[SiteSettings]:
+        """Pick the method and timezone of (latitude, longitude) sites."""
+        if not sites:
+            return []
+        latitudes, longitudes = zip(*sites)
+        timezones = self.timezones_at(latitudes, longitudes)
+        codes = [self.method_of_timezone(timezone) for timezone in timezones]
+        distances = self.distances(latitudes, longitudes, codes)
+        return [
+            SiteSettings(code, timezone, float(distance))
+            for code, timezone, distance in zip(codes, timezones, distances)
+        ]
+
+    def _finder(self) -> TimezoneFinder:
+        """Get the timezone finder, loaded on first use."""
+        if self._timezone_finder is None:
+            self._timezone_finder = TimezoneFinder(in_memory=True)
+        return self._timezone_finder
+
+
+@functools.lru_cache(maxsize=1)
+def get_method_locator() -> MethodLocator:
+    """Get the shared locator, built on first use."""
+    return MethodLocator()
@@ -7,13 +7,14 @@ import math
 from typing import Dict, Any, Optional, Union
 from prayer_times.method import Method
 from prayer_times.dmath import DMath
+from prayer_times.timezone import utc_midnight, utc_offset
 from prayer_times.contants import *
 
 class PrayerTimes:
     """Main class for calculating Islamic prayer times."""
     
-   
-
+    # Math backend, the batch calculator swaps in the array backend
+    dmath = DMath
     
     def __init__(self, method=Method.METHOD_MWL, school=SCHOOL_STANDARD, asr_shadow_factor=None):
         """Initialize PrayerTimes with method and settings."""
@@ -32,6 +33,11 @@ class PrayerTimes:
         self.settings = None
         self.shafaq = 'general'  # Only valid for METHOD_MOONSIGHTING
         self.offset = {}
+        # When False, days on which the sun never reaches an angle give NaN
+        # (as upstream does) instead of the time closest to it
+        self.clamp_sun_angles = True
+        # Whether the sun never reaches the angle of each time, set by every calculation
+        self.unreachable = {}
         
         self.load_methods()
         self.set_method(method)
@@ -40,6 +46,10 @@ class PrayerTimes:
             self.asr_shadow_factor = asr_shadow_factor
         self.load_settings()
     
+    def set_clamp_sun_angles(self, clamp: bool = True):
+        """Set whether unreachable sun angles are clamped or reported as invalid times."""
+        self.clamp_sun_angles = clamp
+    
     def set_shafaq(self, shafaq: str):
         """Set the shafaq parameter for moonsighting method."""
         self.shafaq = shafaq
@@ -107,10 +117,12 @@ class PrayerTimes:
             ISHA: 18
         }
         
+        self.unreachable = {}
         times = self.compute_prayer_times(times)
         times = self.adjust_times(times)
         
-        # add night times
+        # add night times, measured in UTC so that a night crossing a DST
+        # transition is not an hour longer or shorter than it really is
         if self.midnight_mode == MIDNIGHT_MODE_JAFARI:
             diff = self.time_diff(times[SUNSET], times[FAJR])
         else:
@@ -120,6 +132,8 @@ class PrayerTimes:
         times[FIRST_THIRD] = times[SUNSET] + diff / 3
         times[LAST_THIRD] = times[SUNSET] + 2 * (diff / 3)
         
+        times = self.local_times(times)
+        
         # If our method is Moonsighting, reset the Fajr and Isha times
         if self.method == Method.METHOD_MOONSIGHTING:
             times = self.moonsighting_recalculation(times)
@@ -145,7 +159,7 @@ class PrayerTimes:
     def get_formatted_time(self, time: float, format: str, prayer: str) -> Union[str, float]:
         """Format time according to the specified format."""
         if math.isnan(time):
-            return self.INVALID_TIME
+            return INVALID_TIME
         
         if format == TIME_FORMAT_FLOAT:
             return time
@@ -199,32 +213,39 @@ class PrayerTimes:
         return float(value)
     
     def adjust_times(self, times: Dict[str, float]) -> Dict[str, float]:
-        """Adjust times for timezone and other factors."""
-        # Get timezone offset in hours
-        if self.date.tzinfo:
-            tz_offset = self.date.utcoffset().total_seconds() / 3600
-        else:
-            tz_offset = 0
-        
+        """Convert times to UTC hours and adjust them for high latitudes and minute offsets."""
         for prayer in times:
-            times[prayer] += (tz_offset - self.longitude / 15)
+            times[prayer] -= self.longitude / 15
         
         if self.latitude_adjustment_method != LATITUDE_ADJUSTMENT_METHOD_NONE:
             times = self.adjust_high_latitudes(times)
         
+        # times given in minutes follow the time they are counted from
         if self.is_min(self.settings.Imsak):
             times[IMSAK] = times[FAJR] - self.evaluate(self.settings.Imsak) / 60
+            self.unreachable[IMSAK] = self.unreachable[FAJR]
         
         if self.is_min(self.settings.Maghrib):
             times[MAGHRIB] = times[SUNSET] + self.evaluate(self.settings.Maghrib) / 60
+            self.unreachable[MAGHRIB] = self.unreachable[SUNSET]
         
         if self.is_min(self.settings.Isha):
             times[ISHA] = times[MAGHRIB] + self.evaluate(self.settings.Isha) / 60
+            self.unreachable[ISHA] = self.unreachable[MAGHRIB]
         
         times[ZHUHR] += self.evaluate(self.settings.Dhuhr) / 60
         
         return times
     
+    def local_times(self, times: Dict[str, float]) -> Dict[str, float]:
+        """Convert UTC hours to local hours."""
+        # Each time gets the offset in effect at its own instant so DST
+        # transition days are handled correctly
+        for prayer in times:
+            times[prayer] += self.timezone_offset(times[prayer])
+        
+        return times
+    
     def adjust_high_latitudes(self, times: Dict[str, float]) -> Dict[str, float]:
         """Adjust times for high latitude regions."""
         night_time = self.time_diff(times[SUNSET], times[SUNRISE])
@@ -263,13 +284,10 @@ class PrayerTimes:
         else:
             time_diff = self.time_diff(base, time)
         
-        if math.isnan(time) or time_diff > portion:
-            if direction == 'ccw':
-                time = base - portion
-            else:
-                time = base + portion
-        
-        return time
+        exceeded = self.dmath.isnan(time) | (time_diff > portion)
+        if direction == 'ccw':
+            return self.dmath.where(exceeded, base - portion, time)
+        return self.dmath.where(exceeded, base + portion, time)
     
     def night_portion(self, angle: float, night: float) -> float:
         """Calculate night portion based on adjustment method."""
@@ -285,20 +303,20 @@ class PrayerTimes:
     
     def time_diff(self, t1: float, t2: float) -> float:
         """Calculate time difference between two times."""
-        return DMath.fix_hour(t2 - t1)
+        return self.dmath.fix_hour(t2 - t1)
     
     def compute_prayer_times(self, times: Dict[str, float]) -> Dict[str, float]:
         """Compute prayer times using astronomical calculations."""
         times = self.day_portion(times)
         
-        imsak = self.sun_angle_time(self.evaluate(self.settings.Imsak), times[IMSAK], 'ccw')
-        sunrise = self.sun_angle_time(self.rise_set_angle(), times[SUNRISE], 'ccw')
-        fajr = self.sun_angle_time(self.evaluate(self.settings.Fajr), times[FAJR], 'ccw')
+        imsak = self.sun_angle_time(self.evaluate(self.settings.Imsak), times[IMSAK], 'ccw', IMSAK)
+        sunrise = self.sun_angle_time(self.rise_set_angle(), times[SUNRISE], 'ccw', SUNRISE)
+        fajr = self.sun_angle_time(self.evaluate(self.settings.Fajr), times[FAJR], 'ccw', FAJR)
         dhuhr = self.mid_day(times[ZHUHR])
         asr = self.asr_time(self.asr_factor(), times[ASR])
-        sunset = self.sun_angle_time(self.rise_set_angle(), times[SUNSET])
-        maghrib = self.sun_angle_time(self.evaluate(self.settings.Maghrib), times[MAGHRIB])
-        isha = self.sun_angle_time(self.evaluate(self.settings.Isha), times[ISHA])
+        sunset = self.sun_angle_time(self.rise_set_angle(), times[SUNSET], prayer=SUNSET)
+        maghrib = self.sun_angle_time(self.evaluate(self.settings.Maghrib), times[MAGHRIB], prayer=MAGHRIB)
+        isha = self.sun_angle_time(self.evaluate(self.settings.Isha), times[ISHA], prayer=ISHA)
         
         return {
             FAJR: fajr,
@@ -335,29 +353,49 @@ class PrayerTimes:
         
         return jd + frac
     
+    def local_julian_date(self) -> float:
+        """Julian date of the current date at the observer's longitude."""
+        return (self.julian_date(self.date.year, self.date.month, self.date.day) - 
+                self.longitude / (15 * 24))
+    
+    def timezone_offset(self, utc_time: float) -> float:
+        """Get the timezone offset in hours at a time (in UTC hours) of the current date."""
+        if not self.date.tzinfo:
+            return 0
+        if math.isnan(utc_time):
+            utc_time = 12
+        return utc_offset(self.date.tzinfo, utc_midnight(self.date) + utc_time * 3600)
+    
     def asr_time(self, factor: float, time: float) -> float:
         """Calculate Asr prayer time."""
         julian_date = self.gregorian_to_julian_date()
         decl = self.sun_position(julian_date + time)['declination']
         
-        angle = -DMath.arccot(factor + DMath.tan(abs(self.latitude - decl)))
+        angle = -self.dmath.arccot(factor + self.dmath.tan(abs(self.latitude - decl)))
         
-        return self.sun_angle_time(angle, time)
+        return self.sun_angle_time(angle, time, prayer=ASR)
     
-    def sun_angle_time(self, angle: float, time: float, direction: Optional[str] = None) -> float:
-        """Calculate time when sun is at a specific angle."""
-        julian_date = (self.julian_date(self.date.year, self.date.month, self.date.day) - 
-                      self.longitude / (15 * 24))
+    def sun_angle_time(self, angle: float, time: float, direction: Optional[str] = None,
+                       prayer: Optional[str] = None) -> float:
+        """Calculate time when sun is at a specific angle, recording whether it is reached for a prayer."""
+        julian_date = self.local_julian_date()
         decl = self.sun_position(julian_date + time)['declination']
         noon = self.mid_day(time)
         
-        p1 = -DMath.sin(angle) - DMath.sin(decl) * DMath.sin(self.latitude)
-        p2 = DMath.cos(decl) * DMath.cos(self.latitude)
+        p1 = -self.dmath.sin(angle) - self.dmath.sin(decl) * self.dmath.sin(self.latitude)
+        p2 = self.dmath.cos(decl) * self.dmath.cos(self.latitude)
         cos_range = p1 / p2
+        if prayer is not None:
+            self.unreachable[prayer] = abs(cos_range) > 1
         
-        cos_range = max(-1, min(1, cos_range))  # Clamp to [-1, 1]
+        if self.clamp_sun_angles:
+            cos_range = self.dmath.clip(cos_range, -1, 1)  # Clamp to [-1, 1]
+        else:
+            # The sun never reaches the angle that day, NaN flows through the
+            # high latitude adjustment and ends up as INVALID_TIME
+            cos_range = self.dmath.where(abs(cos_range) > 1, math.nan, cos_range)
         
-        t = 1/15 * DMath.arccos(cos_range)
+        t = 1/15 * self.dmath.arccos(cos_range)
         
         if direction == 'ccw':
             return noon - t
@@ -386,16 +424,16 @@ class PrayerTimes:
         # compute declination angle of sun and equation of time
         # Ref: http://aa.usno.navy.mil/faq/docs/SunApprox.php
         d = julian_date - 2451545.0
-        g = DMath.fix_angle(357.529 + 0.98560028 * d)
-        q = DMath.fix_angle(280.459 + 0.98564736 * d)
-        l = DMath.fix_angle(q + 1.915 * DMath.sin(g) + 0.020 * DMath.sin(2 * g))
+        g = self.dmath.fix_angle(357.529 + 0.98560028 * d)
+        q = self.dmath.fix_angle(280.459 + 0.98564736 * d)
+        l = self.dmath.fix_angle(q + 1.915 * self.dmath.sin(g) + 0.020 * self.dmath.sin(2 * g))
         
-        r = 1.00014 - 0.01671 * DMath.cos(g) - 0.00014 * DMath.cos(2 * g)
+        r = 1.00014 - 0.01671 * self.dmath.cos(g) - 0.00014 * self.dmath.cos(2 * g)
         e = 23.439 - 0.00000036 * d
         
-        ra = DMath.arctan2(DMath.cos(e) * DMath.sin(l), DMath.cos(l)) / 15
-        eqt = q / 15 - DMath.fix_hour(ra)
-        decl = DMath.arcsin(DMath.sin(e) * DMath.sin(l))
+        ra = self.dmath.arctan2(self.dmath.cos(e) * self.dmath.sin(l), self.dmath.cos(l)) / 15
+        eqt = q / 15 - self.dmath.fix_hour(ra)
+        decl = self.dmath.arcsin(self.dmath.sin(e) * self.dmath.sin(l))
         
         return {
             'declination': decl,
@@ -417,10 +455,9 @@ class PrayerTimes:
     
     def mid_day(self, time: float) -> float:
         """Calculate midday time."""
-        julian_date = (self.julian_date(self.date.year, self.date.month, self.date.day) - 
-                      self.longitude / (15 * 24))
+        julian_date = self.local_julian_date()
         eqt = self.sun_position(julian_date + time)['equation']
-        noon = DMath.fix_hour(12 - eqt)
+        noon = self.dmath.fix_hour(12 - eqt)
         
         return noon
     
@@ -0,0 +1,185 @@
+"""
+Timestamp indexed prayer schedule for fast "next prayer" queries.
+"""
+
+import bisect
+import datetime
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from prayer_times.batch import BatchPrayerTimes
+from prayer_times.compact import CompactSchedule
+from prayer_times.contants import *
+from prayer_times.timezone import utc_midnight
+
+# Prayers for which an adhan is played
+SCHEDULED_PRAYERS = (FAJR, ZHUHR, ASR, MAGHRIB, ISHA)
+
+# Alerts added during Ramadan, Imsak before Fajr and the last third of the night for Suhoor
+RAMADAN_ALERTS = (IMSAK, LAST_THIRD)
+
+
+class ScheduledPrayer(NamedTuple):
+    """A prayer and the aware datetime at which it happens.
+
+    ``adjusted`` is set on the days the sun never reaches the angle of the
+    prayer, its time then comes from the latitude adjustment method.
+    """
+    name: str
+    time: datetime.datetime
+    adjusted: bool = False
+
+
+class PrayerSchedule:
+    """Sorted schedule of the prayers of the next days of a location.
+
+    Prayers are kept in a list sorted by timestamp so lookups are a bisect.
+    As days roll over the past days are dropped and only the new days of
+    the window are computed, with a single batch calculation. Days held by
+    the optional precomputed ``cache`` are read from it instead.
+
+    ``seasons`` maps a prayer to a predicate of the day it falls on, the
+    prayer is only kept on the days where it holds (Ramadan alerts).
+    """
+
+    def __init__(self, prayer_times: BatchPrayerTimes, latitude: float, longitude: float,
+                 tzinfo: datetime.tzinfo, days: int = 7,
+                 prayers: Sequence[str] = SCHEDULED_PRAYERS,
+                 elevation: Optional[float] = None,
+                 latitude_adjustment_method: str = LATITUDE_ADJUSTMENT_METHOD_ANGLE,
+                 cache: Optional[CompactSchedule] = None,
+                 seasons: Optional[Dict[str, Callable[[datetime.date], bool]]] = None):
+        """Initialize an empty schedule, it is filled on the first query."""
+        self.prayer_times = prayer_times
+        self.latitude = latitude
+        self.longitude = longitude
+        self.tzinfo = tzinfo
+        self.days = days
+        self.prayers = tuple(prayers)
+        self.elevation = elevation
+        self.latitude_adjustment_method = latitude_adjustment_method
+        # times computed beforehand with the same calculator and location
+        self.cache = cache
+        self.seasons = seasons or {}
+        self.first_day: Optional[datetime.date] = None
+        self.end_day: Optional[datetime.date] = None
+        self._timestamps: List[float] = []
+        self._entries: List[ScheduledPrayer] = []
+        self._lock = threading.RLock()
+
+    def next_prayer(self, now: datetime.datetime) -> Optional[ScheduledPrayer]:
+        """Get the first prayer strictly after now."""
+        with self._lock:
+            self._roll(now)
+            i = bisect.bisect_right(self._timestamps, now.timestamp())
+            if i < len(self._entries):
+                return self._entries[i]
+            return None
+
+    def prayers_between(self, start: datetime.datetime, end: datetime.datetime) -> List[ScheduledPrayer]:
+        """Get the prayers in [start, end), limited to the days of the window."""
+        with self._lock:
+            self._roll(start)
+            i = bisect.bisect_left(self._timestamps, start.timestamp())
+            j = bisect.bisect_left(self._timestamps, end.timestamp())
+            return self._entries[i:j]
+
+    def refill(self, now: datetime.datetime):
+        """Drop the days before now and compute the missing days of the window."""
+        with self._lock:
+            today = now.astimezone(self.tzinfo).date()
+            end = today + datetime.timedelta(days=self.days)
+
+            if self.first_day is None or today < self.first_day or today >= self.end_day:
+                self._timestamps = []
+                self._entries = []
+                start = today
+            else:
+                cut = bisect.bisect_left(self._timestamps, self._midnight(today).timestamp())
+                del self._timestamps[:cut]
+                del self._entries[:cut]
+                start = self.end_day
+
+            days = [start + datetime.timedelta(days=i) for i in range((end - start).days)]
+            if days:
+                self._extend(days)
+            self.first_day = today
+            self.end_day = end
+
+    def _roll(self, now: datetime.datetime):
+        """Refill the schedule if now is on another day than the first one."""
+        if self.first_day != now.astimezone(self.tzinfo).date():
+            self.refill(now)
+
+    def _extend(self, days: List[datetime.date]):
+        """Compute the prayers of the given days and add them to the index."""
+        formatted_days = {}
+        unreachable_days = {}
+        if self.cache is not None:
+            for day in days:
+                if day in self.cache:
+                    formatted_days[day] = self.cache[day]
+                    unreachable_days[day] = self.cache.unreachable_fields(day)
+        missing = [day for day in days if day not in formatted_days]
+        if missing:
+            dates = [self._midnight(day) for day in missing]
+            times = self.prayer_times.get_times_for_dates(
+                dates, self.latitude, self.longitude, self.elevation, self.latitude_adjustment_method
+            )
+            masks = self.prayer_times.get_unreachable_days()
+            for i, day in enumerate(missing):
+                formatted_days[day] = self.prayer_times.get_formatted_day(times, i)
+                unreachable_days[day] = tuple(prayer for prayer, mask in masks.items() if mask[i])
+
+        entries = []
+        utc_days = {}
+        for day in days:
+            formatted = formatted_days[day]
+            previous = None
+            for prayer in self.prayers:
+                if formatted[prayer] == INVALID_TIME:
+                    continue
+                hour, minute = formatted[prayer].split(':')
+                # Wall time so that zoneinfo resolves the offset of the prayer itself
+                prayer_datetime = datetime.datetime.combine(
+                    day, datetime.time(int(hour), int(minute)), tzinfo=self.tzinfo
+                )
+                # Night times such as Midnight fall on the next calendar day
+                if previous is not None and prayer_datetime.timestamp() < previous.timestamp():
+                    prayer_datetime = datetime.datetime.combine(
+                        day + datetime.timedelta(days=1), prayer_datetime.time(), tzinfo=self.tzinfo
+                    )
+                if prayer_datetime.utcoffset() != prayer_datetime.replace(fold=1).utcoffset():
+                    prayer_datetime = self._resolve_fold(prayer_datetime, prayer, day, utc_days)
+                previous = prayer_datetime
+                season = self.seasons.get(prayer)
+                if season is not None and not season(prayer_datetime.date()):
+                    continue
+                entries.append(ScheduledPrayer(prayer, prayer_datetime, prayer in unreachable_days[day]))
+
+        entries.sort(key=lambda entry: entry.time.timestamp())
+        timestamps = [entry.time.timestamp() for entry in entries]
+        self._entries.extend(entries)
+        if timestamps and self._timestamps and timestamps[0] < self._timestamps[-1]:
+            self._entries.sort(key=lambda entry: entry.time.timestamp())
+            self._timestamps = [entry.time.timestamp() for entry in self._entries]
+        else:
+            self._timestamps.extend(timestamps)
+
+    def _resolve_fold(self, prayer_datetime: datetime.datetime, prayer: str, day: datetime.date,
+                      utc_days: Dict[datetime.date, Dict[str, float]]) -> datetime.datetime:
+        """Pick which of the two instants of a wall time repeated by a DST transition the prayer is at."""
+        # the times of the day in UTC hours tell the instants apart
+        if day not in utc_days:
+            times = self.prayer_times.get_times_for_dates(
+                [datetime.datetime.combine(day, datetime.time(0), tzinfo=datetime.timezone.utc)],
+                self.latitude, self.longitude, self.elevation, self.latitude_adjustment_method
+            )
+            utc_days[day] = {name: float(values[0]) for name, values in times.items()}
+        instant = utc_midnight(day) + utc_days[day][prayer] * 3600
+        return min((prayer_datetime.replace(fold=fold) for fold in (0, 1)),
+                   key=lambda candidate: abs(candidate.timestamp() - instant))
+
+    def _midnight(self, day: datetime.date) -> datetime.datetime:
+        """Get the local midnight of a day."""
+        return datetime.datetime.combine(day, datetime.time(0), tzinfo=self.tzinfo)
@@ -0,0 +1,130 @@
+"""
+Timezone offset resolution with cached DST transition tables.
+
+The offset of a prayer is the one in effect at the instant of that prayer, not
+the one of the date it was requested with, so times on DST transition days
+land on the right side of the change.
+"""
+
+import bisect
+import datetime
+import functools
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+_DAY = 86400
+
+
+def resolve_zone(tzinfo: datetime.tzinfo) -> datetime.tzinfo:
+    """Get the zoneinfo zone matching a tzinfo, pytz zones are converted."""
+    key = getattr(tzinfo, 'key', None) or getattr(tzinfo, 'zone', None)
+    if key:
+        return ZoneInfo(key)
+    return tzinfo
+
+
+class TransitionTable:
+    """UTC offsets of a zone indexed by the instants at which they change."""
+
+    def __init__(self, zone: datetime.tzinfo):
+        """Initialize an empty table, years are loaded on demand."""
+        self.zone = zone
+        # (first year, last year, starts, offsets, offsets as an array), swapped and
+        # read as a whole so scheduler threads never see the years of another table
+        self._table = (None, None, [], [], None)
+
+    @property
+    def first_year(self) -> Optional[int]:
+        """First year covered by the table, None until a year is loaded."""
+        return self._table[0]
+
+    @property
+    def last_year(self) -> Optional[int]:
+        """Last year covered by the table, None until a year is loaded."""
+        return self._table[1]
+
+    @property
+    def starts(self) -> List[int]:
+        """Instants at which each offset comes into effect."""
+        return self._table[2]
+
+    @property
+    def offsets(self) -> List[float]:
+        """UTC offsets in hours, one per start instant."""
+        return self._table[3]
+
+    def offset_at(self, timestamp: float) -> float:
+        """Get the UTC offset in hours in effect at a POSIX timestamp."""
+        starts, offsets, _ = self.cover(timestamp, timestamp)
+        return offsets[bisect.bisect_right(starts, timestamp) - 1]
+
+    def offsets_at(self, timestamps: np.ndarray) -> np.ndarray:
+        """Get the UTC offsets in hours in effect at an array of POSIX timestamps."""
+        starts, _, offsets = self.cover(float(timestamps.min()), float(timestamps.max()))
+        return offsets[np.searchsorted(starts, timestamps, side='right') - 1]
+
+    def cover(self, first_timestamp: float, last_timestamp: float) -> Tuple[List[int], List[float], np.ndarray]:
+        """Make sure the table holds every transition between two timestamps and return it."""
+        first_year = datetime.datetime.fromtimestamp(first_timestamp, datetime.timezone.utc).year
+        last_year = datetime.datetime.fromtimestamp(last_timestamp, datetime.timezone.utc).year
+        table_first_year, table_last_year, starts, offsets, offsets_array = self._table
+        if table_first_year is not None:
+            if table_first_year <= first_year and last_year <= table_last_year:
+                return starts, offsets, offsets_array
+            first_year = min(first_year, table_first_year)
+            last_year = max(last_year, table_last_year)
+        return self._build(first_year, last_year)
+
+    def _build(self, first_year: int, last_year: int) -> Tuple[List[int], List[float], np.ndarray]:
+        """Scan the zone day by day and pin every offset change to the second."""
+        start = int(datetime.datetime(first_year, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+        end = int(datetime.datetime(last_year + 1, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+
+        starts = [start]
+        offsets = [self._offset(start)]
+        t = start
+        while t < end:
+            next_t = min(t + _DAY, end)
+            offset = self._offset(next_t)
+            if offset != offsets[-1]:
+                low, high = t, next_t
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if self._offset(middle) == offsets[-1]:
+                        low = middle
+                    else:
+                        high = middle
+                starts.append(high)
+                offsets.append(offset)
+            t = next_t
+
+        offsets_array = np.array(offsets)
+        self._table = (first_year, last_year, starts, offsets, offsets_array)
+        return starts, offsets, offsets_array
+
+    def _offset(self, timestamp: int) -> float:
+        """Ask the zone for its UTC offset in hours at a POSIX timestamp."""
+        return datetime.datetime.fromtimestamp(timestamp, self.zone).utcoffset().total_seconds() / 3600
+
+
+@functools.lru_cache(maxsize=None)
+def get_transition_table(zone: datetime.tzinfo) -> TransitionTable:
+    """Get the shared transition table of a zone."""
+    return TransitionTable(zone)
+
+
+def utc_offset(tzinfo: datetime.tzinfo, timestamp: float) -> float:
+    """Get the UTC offset in hours of a tzinfo at a POSIX timestamp."""
+    return get_transition_table(resolve_zone(tzinfo)).offset_at(timestamp)
+
+
+def utc_offsets(tzinfo: datetime.tzinfo, timestamps: np.ndarray) -> np.ndarray:
+    """Get the UTC offsets in hours of a tzinfo at an array of POSIX timestamps."""
+    return get_transition_table(resolve_zone(tzinfo)).offsets_at(timestamps)
+
+
+def utc_midnight(date: datetime.date) -> float:
+    """Get the POSIX timestamp of midnight UTC of a calendar date."""
+    return datetime.datetime(date.year, date.month, date.day, tzinfo=datetime.timezone.utc).timestamp()
@@ -0,0 +1,45 @@
+"""Fixtures running the daemon module in a scratch directory."""
+
+import atexit
+import importlib
+import logging
+import sys
+
+import pytest
+from pydub import AudioSegment
+
+CONFIG = """
+[location]
+latitude = 45.583729
+longitude = -73.750069
+timezone = "America/Toronto"
+
+[audio]
+adhan = "adhan.wav"
+reminder = "reminder.wav"
+iqama = "iqama.wav"
+"""
+
+
+@pytest.fixture
+def piazan(tmp_path, monkeypatch):
+    """Import piazan.py afresh next to a config and short silent audio, undo its global state afterwards."""
+    for name, milliseconds in (('adhan', 3000), ('reminder', 500), ('iqama', 1000)):
+        AudioSegment.silent(milliseconds, frame_rate=8000).export(str(tmp_path / f'{name}.wav'), format='wav')
+    (tmp_path / 'piazan.toml').write_text(CONFIG)
+    monkeypatch.chdir(tmp_path)
+    sys.modules.pop('piazan', None)
+    module = importlib.import_module('piazan')
+    yield module
+
+    if module.scheduler is not None and module.scheduler.running:
+        module.scheduler.shutdown(wait=False)
+    module.audio_engine.close()
+    module.log_listener.stop()
+    atexit.unregister(module.log_listener.stop)
+    for name in ('piazan', 'apscheduler'):
+        logger = logging.getLogger(name)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+    logging.getLogger('piazan').setLevel(logging.NOTSET)
+    sys.modules.pop('piazan', None)
@@ -0,0 +1,95 @@
+"""Prayer times on the nights of the 2025 DST transitions of America/Toronto."""
+
+import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from prayer_times.batch import BatchPrayerTimes
+from prayer_times.contants import *
+from prayer_times.golden import CITIES, expected_night, minutes_delta
+from prayer_times.method import Method
+from prayer_times.prayer_times import PrayerTimes
+from prayer_times.schedule import PrayerSchedule, SCHEDULED_PRAYERS
+from prayer_times.timezone import TransitionTable
+
+ZONE = ZoneInfo('America/Toronto')
+
+TRANSITION_NIGHTS = [
+    datetime.date(2025, 3, 8),
+    datetime.date(2025, 3, 9),
+    datetime.date(2025, 11, 1),
+    datetime.date(2025, 11, 2),
+]
+
+
+def day_times(calculator: str, city: str, date: datetime.date) -> dict:
+    latitude, longitude, _ = CITIES[city]
+    midnight = datetime.datetime(date.year, date.month, date.day, tzinfo=ZONE)
+    if calculator == 'batch':
+        pt = BatchPrayerTimes(method=Method.METHOD_ISNA)
+        return pt.get_formatted_day(pt.get_times_for_dates([midnight], latitude, longitude), 0)
+    return PrayerTimes(method=Method.METHOD_ISNA).get_times(midnight, latitude, longitude)
+
+
+def night_alerts(city: str, date: datetime.date) -> dict:
+    latitude, longitude, _ = CITIES[city]
+    schedule = PrayerSchedule(BatchPrayerTimes(method=Method.METHOD_ISNA), latitude, longitude, ZONE, days=2,
+                              prayers=SCHEDULED_PRAYERS + (MIDNIGHT, LAST_THIRD))
+    start = datetime.datetime(date.year, date.month, date.day, 12, tzinfo=ZONE)
+    alerts = {}
+    for prayer in schedule.prayers_between(start, start + datetime.timedelta(days=1)):
+        alerts.setdefault(prayer.name, prayer.time)
+    return alerts
+
+
+@pytest.mark.parametrize('calculator', ['scalar', 'batch'])
+@pytest.mark.parametrize('date', TRANSITION_NIGHTS, ids=str)
+def test_night_times_follow_elapsed_night(calculator, date):
+    day = day_times(calculator, 'Toronto', date)
+    for prayer, timestamp in expected_night(day, date, ZONE).items():
+        expected = datetime.datetime.fromtimestamp(timestamp, ZONE).strftime('%H:%M')
+        assert abs(minutes_delta(expected, day[prayer])) <= 1, prayer
+
+
+@pytest.mark.parametrize('date', TRANSITION_NIGHTS, ids=str)
+def test_scalar_and_batch_agree(date):
+    assert day_times('scalar', 'Toronto', date) == day_times('batch', 'Toronto', date)
+
+
+def test_spring_forward_night_spans_both_offsets():
+    day = day_times('batch', 'Toronto', datetime.date(2025, 3, 8))
+    assert (day[MIDNIGHT], day[LAST_THIRD]) == ('00:28', '03:32')
+    alerts = night_alerts('Toronto', datetime.date(2025, 3, 8))
+    assert alerts[MIDNIGHT].utcoffset() == datetime.timedelta(hours=-5)
+    assert alerts[LAST_THIRD].utcoffset() == datetime.timedelta(hours=-4)
+
+
+def test_fall_back_alert_before_the_repeated_hour():
+    alerts = night_alerts('Toronto', datetime.date(2025, 11, 1))
+    midnight = alerts[MIDNIGHT]
+    assert (midnight.hour, midnight.minute, midnight.fold) == (1, 1, 0)
+    assert midnight.utcoffset() == datetime.timedelta(hours=-4)
+
+
+def test_fall_back_alert_in_the_repeated_hour():
+    # 01:57 happens twice that night, the last third is the second one, after the change to EST
+    day = day_times('batch', 'Laval', datetime.date(2025, 11, 1))
+    assert day[LAST_THIRD] == '01:57'
+    last_third = night_alerts('Laval', datetime.date(2025, 11, 1))[LAST_THIRD]
+    assert (last_third.hour, last_third.minute, last_third.fold) == (1, 57, 1)
+    assert last_third.utcoffset() == datetime.timedelta(hours=-5)
+    expected = expected_night(day, datetime.date(2025, 11, 1), ZONE)[LAST_THIRD]
+    assert abs(last_third.timestamp() - expected) <= 60
+
+
+def test_transition_table_extends_its_years():
+    table = TransitionTable(ZONE)
+    assert table.first_year is None
+    fall_back = datetime.datetime(2025, 11, 2, 6, tzinfo=datetime.timezone.utc).timestamp()
+    assert table.offset_at(fall_back - 1) == -4
+    assert table.offset_at(fall_back) == -5
+    assert (table.first_year, table.last_year) == (2025, 2025)
+    assert table.offset_at(fall_back - 365 * 86400) == -4
+    assert (table.first_year, table.last_year) == (2024, 2025)
+    assert len(table.starts) == len(table.offsets) == 5
@@ -0,0 +1,78 @@
+"""Stop button and LEDs of the adhan panel, on simulated pins."""
+
+import threading
+import time
+
+import pytest
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_MISSED, JobEvent
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from daemon.gpio import AdhanPanel, ERROR_LED_PIN, STATUS_LED_PIN, STOP_BUTTON_PIN, mock_pin_factory
+
+
+@pytest.fixture
+def pins():
+    factory = mock_pin_factory()
+    yield factory
+    factory.close()
+
+
+@pytest.fixture
+def panel(pins):
+    stops = []
+    panel = AdhanPanel(lambda: stops.append(True), pin_factory=pins)
+    panel.stops = stops
+    yield panel
+    panel.close()
+
+
+def press(pins):
+    button = pins.pin(STOP_BUTTON_PIN)
+    # the button pulls up, pressing it drives the pin low
+    button.drive_low()
+    button.drive_high()
+
+
+def test_stop_button_stops_playback_and_clears_the_error(pins, panel):
+    panel.error_led.on()
+    press(pins)
+    assert panel.stops == [True]
+    assert not pins.pin(ERROR_LED_PIN).state
+
+
+def test_status_led_follows_the_schedule(pins, panel):
+    panel.show_next_prayer(True)
+    assert pins.pin(STATUS_LED_PIN).state
+    panel.show_prayer_soon()
+    assert panel.status_led.is_active
+    panel.show_next_prayer(False)
+    assert not pins.pin(STATUS_LED_PIN).state
+
+
+def test_failed_job_lights_the_error_led(pins, panel):
+    scheduler = BackgroundScheduler()
+    panel.listen(scheduler)
+    failed = threading.Event()
+    scheduler.add_listener(lambda event: failed.set(), EVENT_JOB_ERROR)
+
+    def broken_job():
+        raise RuntimeError("no audio device")
+
+    scheduler.add_job(broken_job)
+    scheduler.start()
+    try:
+        assert failed.wait(5)
+        # the scheduler thread removes the job once it has been submitted
+        deadline = time.monotonic() + 5
+        while scheduler.get_jobs() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scheduler.shutdown()
+    assert pins.pin(ERROR_LED_PIN).state
+
+
+def test_missed_job_lights_the_error_led(pins, panel):
+    panel.on_scheduler_event(JobEvent(EVENT_JOB_MISSED, 'Fajr', None))
+    assert pins.pin(ERROR_LED_PIN).state
+    press(pins)
+    assert not pins.pin(ERROR_LED_PIN).state
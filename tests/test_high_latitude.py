@@ -0,0 +1,106 @@
+"""Days on which the sun never reaches the angle of Fajr and Isha, at 60°N in June."""
+
+import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from daemon.config import load_config
+from prayer_times.batch import BatchPrayerTimes
+from prayer_times.compact import CompactSchedule
+from prayer_times.contants import *
+from prayer_times.method import Method
+from prayer_times.schedule import PrayerSchedule, SCHEDULED_PRAYERS
+
+ZONE = ZoneInfo('Europe/Helsinki')
+LATITUDE, LONGITUDE = 60.169856, 24.938379
+JUNE = [datetime.datetime(2025, 6, 1, tzinfo=ZONE) + datetime.timedelta(days=i) for i in range(30)]
+
+
+def calculator() -> BatchPrayerTimes:
+    prayer_times = BatchPrayerTimes(method=Method.METHOD_ISNA)
+    prayer_times.set_clamp_sun_angles(False)
+    return prayer_times
+
+
+def test_unreachable_days_found_with_the_times():
+    prayer_times = calculator()
+    times = prayer_times.get_times_for_dates(JUNE, LATITUDE, LONGITUDE)
+    unreachable = prayer_times.get_unreachable_days()
+    assert unreachable[FAJR].all() and unreachable[ISHA].all() and unreachable[IMSAK].all()
+    assert not unreachable[SUNRISE].any() and not unreachable[SUNSET].any() and not unreachable[ASR].any()
+
+    # Fajr is 15/60 of the night before sunrise, Isha 15/60 of the night after sunset
+    night = (times[SUNRISE] - times[SUNSET]) % 24
+    np.testing.assert_allclose(times[FAJR], times[SUNRISE] - night / 4, atol=1e-9)
+    np.testing.assert_allclose(times[ISHA], times[SUNSET] + night / 4, atol=1e-9)
+
+
+def test_reachable_in_winter():
+    prayer_times = calculator()
+    december = [datetime.datetime(2025, 12, 1, tzinfo=ZONE) + datetime.timedelta(days=i) for i in range(30)]
+    prayer_times.get_times_for_dates(december, LATITUDE, LONGITUDE)
+    assert not any(mask.any() for mask in prayer_times.get_unreachable_days().values())
+
+
+def test_clamping_does_not_change_the_adjusted_times():
+    clamped = BatchPrayerTimes(method=Method.METHOD_ISNA).get_times_for_dates(JUNE, LATITUDE, LONGITUDE)
+    times = calculator().get_times_for_dates(JUNE, LATITUDE, LONGITUDE)
+    for prayer, values in times.items():
+        np.testing.assert_allclose(values, clamped[prayer], err_msg=prayer)
+
+
+def test_unreachable_times_are_invalid_without_adjustment():
+    prayer_times = calculator()
+    times = prayer_times.get_times_for_dates(JUNE, LATITUDE, LONGITUDE,
+                                             latitude_adjustment_method=LATITUDE_ADJUSTMENT_METHOD_NONE)
+    assert np.isnan(times[FAJR]).all() and np.isnan(times[ISHA]).all()
+    day = prayer_times.get_formatted_days(times)[0]
+    assert day[FAJR] == INVALID_TIME and day[SUNRISE] != INVALID_TIME
+
+
+def test_minute_based_isha_follows_maghrib():
+    prayer_times = BatchPrayerTimes(method=Method.METHOD_MAKKAH)
+    prayer_times.get_times_for_dates(JUNE, LATITUDE, LONGITUDE)
+    unreachable = prayer_times.get_unreachable_days()
+    # Makkah sets Isha 90 minutes after Maghrib, which is always reached
+    assert unreachable[FAJR].all() and not unreachable[ISHA].any()
+
+
+@pytest.mark.parametrize('latitude_adjustment_method', [LATITUDE_ADJUSTMENT_METHOD_ANGLE,
+                                                        LATITUDE_ADJUSTMENT_METHOD_NONE])
+def test_schedule_marks_adjusted_prayers(latitude_adjustment_method):
+    schedule = PrayerSchedule(calculator(), LATITUDE, LONGITUDE, ZONE, days=3,
+                              latitude_adjustment_method=latitude_adjustment_method)
+    start = JUNE[0]
+    prayers = schedule.prayers_between(start, start + datetime.timedelta(days=3))
+    adjusted = {prayer.name for prayer in prayers if prayer.adjusted}
+    names = {prayer.name for prayer in prayers}
+    if latitude_adjustment_method == LATITUDE_ADJUSTMENT_METHOD_NONE:
+        # nothing to fall back on, the prayers are left out
+        assert names == {ZHUHR, ASR, MAGHRIB} and not adjusted
+    else:
+        assert names == set(SCHEDULED_PRAYERS) and adjusted == {FAJR, ISHA}
+
+
+def test_compact_schedule_keeps_unreachable_days():
+    compact = CompactSchedule.compute(calculator(), datetime.date(2025, 4, 1), 90, LATITUDE, LONGITUDE, ZONE)
+    loaded = CompactSchedule.from_buffer(compact.to_bytes())
+    assert loaded.unreachable_fields(datetime.date(2025, 6, 21)) == (IMSAK, FAJR, ISHA)
+    assert loaded.unreachable_fields(datetime.date(2025, 4, 1)) == ()
+    assert loaded[datetime.date(2025, 6, 1):datetime.date(2025, 6, 2)].unreachable_fields(datetime.date(2025, 6, 1))
+
+    cached = PrayerSchedule(calculator(), LATITUDE, LONGITUDE, ZONE, days=3, cache=loaded)
+    computed = PrayerSchedule(calculator(), LATITUDE, LONGITUDE, ZONE, days=3)
+    end = JUNE[0] + datetime.timedelta(days=3)
+    assert cached.prayers_between(JUNE[0], end) == computed.prayers_between(JUNE[0], end)
+
+
+def test_config_latitude_adjustment(tmp_path):
+    path = tmp_path / 'piazan.toml'
+    path.write_text('[calculation]\nlatitude_adjustment = "ONE_SEVENTH"\n')
+    assert load_config(str(path)).latitude_adjustment_method == LATITUDE_ADJUSTMENT_METHOD_ONESEVENTH
+    path.write_text('[calculation]\nlatitude_adjustment = "SEVENTH"\n')
+    with pytest.raises(ValueError):
+        load_config(str(path))
@@ -0,0 +1,55 @@
+"""Method and timezone picked from coordinates."""
+
+import numpy as np
+import pytest
+
+from prayer_times.location import FALLBACK_METHOD, MethodLocator, get_method_locator
+from prayer_times.method import Method
+
+
+@pytest.mark.parametrize('latitude, longitude, method, timezone', [
+    (52.520008, 13.404954, Method.METHOD_MWL, 'Europe/Berlin'),
+    (61.218056, -149.900278, Method.METHOD_ISNA, 'America/Anchorage'),
+    (45.583729, -73.750069, Method.METHOD_ISNA, 'America/Toronto'),
+    (48.856614, 2.352222, Method.METHOD_FRANCE, 'Europe/Paris'),
+    (30.044420, 31.235712, Method.METHOD_EGYPT, 'Africa/Cairo'),
+    (-6.208763, 106.845599, Method.METHOD_KEMENAG, 'Asia/Jakarta'),
+])
+def test_method_of_the_country(latitude, longitude, method, timezone):
+    site = get_method_locator().resolve([(latitude, longitude)])[0]
+    assert (site.method, site.timezone) == (method, timezone)
+    assert get_method_locator().method_at(latitude, longitude) == method
+
+
+def test_fallback_at_sea():
+    site = get_method_locator().resolve([(0.0, -30.0)])[0]
+    assert site.method == FALLBACK_METHOD
+
+
+def test_country_table_can_be_replaced():
+    locator = MethodLocator({'DE': Method.METHOD_TURKEY})
+    assert locator.method_at(52.520008, 13.404954) == Method.METHOD_TURKEY
+    assert locator.method_at(48.856614, 2.352222) == FALLBACK_METHOD
+    with pytest.raises(ValueError):
+        MethodLocator({'DE': 'NOT_A_METHOD'})
+
+
+def test_batch_matches_single_lookups():
+    rng = np.random.default_rng(1)
+    latitudes = np.round(rng.uniform(35, 60, 300), 1)
+    longitudes = np.round(rng.uniform(-10, 40, 300), 1)
+    locator = get_method_locator()
+    sites = locator.resolve(list(zip(latitudes, longitudes)))
+    assert [site.timezone for site in sites] == [
+        locator.timezone_at(latitude, longitude) for latitude, longitude in zip(latitudes, longitudes)
+    ]
+    assert [site.method for site in sites] == [
+        locator.method_at(latitude, longitude) for latitude, longitude in zip(latitudes, longitudes)
+    ]
+
+
+def test_distance_to_the_reference_location():
+    paris, laval = get_method_locator().resolve([(48.856614, 2.352222), (45.583729, -73.750069)])
+    assert paris.distance_km < 1
+    # the ISNA reference location is in Indiana
+    assert 1100 < laval.distance_km < 1300
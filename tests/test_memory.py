@@ -0,0 +1,34 @@
+"""Memory and job count across simulated days of rescheduling."""
+
+import datetime
+import logging
+
+from daemon.memory import MemoryTracker
+
+DAYS = 365
+# allowed RSS growth over DAYS of rescheduling
+RSS_BUDGET = 1024 * 1024
+
+
+def test_rescheduling_does_not_grow(piazan):
+    # rescheduling runs with the scheduler paused, the jobs of every simulated day are added and replaced
+    piazan.scheduler = piazan.create_scheduler(use_asyncio=False)
+    piazan.scheduler.start(paused=True)
+    logging.getLogger('piazan').setLevel(logging.WARNING)
+    start = piazan.clock.now(piazan.local_timezone)
+
+    def reschedule(days: range):
+        for i in days:
+            piazan.schedule_prayer_times(start + datetime.timedelta(days=i))
+
+    # warm up so that caches and the first allocations of the job store are in place
+    warmup = 30
+    reschedule(range(warmup))
+    tracker = MemoryTracker()
+    with tracker.step(f'{DAYS} days'):
+        reschedule(range(warmup, warmup + DAYS))
+
+    assert tracker.steps[-1].rss <= RSS_BUDGET, tracker.format_report()
+    # one day of prayer jobs is left, more means stale jobs are kept
+    assert len(piazan.scheduler.get_jobs()) <= 4 * len(piazan.DAEMON_PRAYERS)
+    assert set(piazan.status_jobs) <= set(piazan.DAEMON_PRAYERS) | {'recompute_prayer_times'}
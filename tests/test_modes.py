@@ -0,0 +1,73 @@
+"""The same jobs on the real clock in the asyncio and threaded modes."""
+
+import asyncio
+import datetime
+import threading
+import time
+from typing import List, Tuple
+
+import pytest
+
+from daemon.metrics import Histogram, LATENESS_BUCKETS
+
+JOBS = 100
+SPACING = 0.01
+# far above the lateness of either mode, only a stalled scheduler reaches it
+MAX_LATENESS = 0.5
+
+
+def run_jobs(piazan, use_asyncio: bool) -> Tuple[Histogram, List[str]]:
+    """Run JOBS jobs SPACING seconds apart, return their lateness and the threads they ran on."""
+    lateness = Histogram(LATENESS_BUCKETS)
+    threads: List[str] = []
+
+    def fire(scheduled: float, finish=None):
+        # measured in the job, so the hand-off from the scheduler to the executor is included
+        lateness.observe(max(0.0, time.time() - scheduled))
+        threads.append(threading.current_thread().name)
+        if finish:
+            finish()
+
+    def add_jobs(scheduler, finish):
+        first = time.time() + 0.2
+        for i in range(JOBS):
+            run_time = first + i * SPACING
+            scheduler.add_job(fire, 'date', run_date=datetime.datetime.fromtimestamp(run_time, piazan.local_timezone),
+                              args=[run_time, finish if i == JOBS - 1 else None])
+
+    if use_asyncio:
+        async def run():
+            piazan.event_loop = asyncio.get_running_loop()
+            finished = asyncio.Event()
+            piazan.scheduler = piazan.create_scheduler(use_asyncio=True)
+            add_jobs(piazan.scheduler, finished.set)
+            piazan.scheduler.start()
+            await asyncio.wait_for(finished.wait(), 10)
+            piazan.scheduler.shutdown()
+
+        try:
+            asyncio.run(run())
+        finally:
+            piazan.event_loop = None
+    else:
+        finished = threading.Event()
+        piazan.scheduler = piazan.create_scheduler(use_asyncio=False)
+        add_jobs(piazan.scheduler, finished.set)
+        piazan.scheduler.start()
+        assert finished.wait(10)
+        piazan.scheduler.shutdown()
+    return lateness, threads
+
+
+@pytest.mark.parametrize('use_asyncio', [False, True], ids=['threads', 'asyncio'])
+def test_every_job_runs_on_time(piazan, use_asyncio):
+    lateness, _ = run_jobs(piazan, use_asyncio)
+    assert lateness.count == JOBS
+    assert lateness.max < MAX_LATENESS
+
+
+def test_asyncio_jobs_run_on_the_loop(piazan):
+    _, threads = run_jobs(piazan, use_asyncio=True)
+    assert set(threads) == {threading.main_thread().name}
+    _, threads = run_jobs(piazan, use_asyncio=False)
+    assert threading.main_thread().name not in threads
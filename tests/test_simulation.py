@@ -0,0 +1,94 @@
+"""Days of scheduling replayed on a simulated clock with a fake audio sink."""
+
+import dataclasses
+import datetime
+from typing import Dict
+
+from daemon.clock import SimulatedClock
+from daemon.simulation import FakeAudioSink, SimulatedScheduler, SimulationRecorder
+from prayer_times.contants import LATITUDE_ADJUSTMENT_METHOD_NONE
+from prayer_times.schedule import SCHEDULED_PRAYERS
+
+# jobs which play a sound each time they run
+PLAY_JOBS = ('prayer_adhan_function', 'play_reminder', 'play_iqama', 'play_ramadan_alert')
+
+
+def simulate(piazan, days: int, start: datetime.date, wake_latency: float = 0.0):
+    """Run the real jobs for days from start, every wake-up delayed by wake_latency seconds."""
+    piazan.clock = SimulatedClock(datetime.datetime.combine(start, datetime.time(0), tzinfo=piazan.local_timezone))
+    sink = FakeAudioSink(piazan.clock)
+    piazan.audio_engine.play = sink
+    piazan.scheduler = SimulatedScheduler(piazan.clock, datetime.timedelta(seconds=wake_latency),
+                                          settle=piazan.audio_engine.wait_idle,
+                                          job_defaults=piazan.job_defaults, timezone=piazan.local_timezone)
+    recorder = SimulationRecorder(piazan.scheduler)
+    piazan.metrics.listen(piazan.scheduler)
+
+    piazan.load_startup_state()
+    piazan.audio_engine.start()
+    piazan.scheduler.start()
+    piazan.schedule_prayer_times()
+    piazan.scheduler.run_until(piazan.clock.now(piazan.local_timezone) + datetime.timedelta(days=days))
+    piazan.scheduler.shutdown()
+    return recorder, sink
+
+
+def adhans_per_day(piazan, recorder) -> Dict[datetime.date, int]:
+    days: Dict[datetime.date, int] = {}
+    for fire in recorder.fires_of(piazan.prayer_adhan_function.__name__):
+        if fire.outcome == 'executed':
+            day = fire.scheduled.astimezone(piazan.local_timezone).date()
+            days[day] = days.get(day, 0) + 1
+    return days
+
+
+def expected_per_day(piazan, days: int, start: datetime.date) -> Dict[datetime.date, int]:
+    # days with invalid times (polar regions) have fewer adhans, the schedule is the reference
+    begin = datetime.datetime.combine(start, datetime.time(0), tzinfo=piazan.local_timezone)
+    expected = {start + datetime.timedelta(days=i): 0 for i in range(days)}
+    for prayer in piazan.create_prayer_schedule(days).prayers_between(begin, begin + datetime.timedelta(days=days)):
+        if prayer.name in SCHEDULED_PRAYERS:
+            expected[prayer.time.date()] += 1
+    return expected
+
+
+def test_every_adhan_of_every_day_across_dst(piazan):
+    # both 2025 transitions of America/Toronto
+    start, days = datetime.date(2025, 3, 1), 260
+    recorder, sink = simulate(piazan, days, start)
+
+    assert [fire for fire in recorder.fires if fire.outcome != 'executed'] == []
+    assert max(fire.lateness for fire in recorder.fires) == 0.0
+    assert adhans_per_day(piazan, recorder) == expected_per_day(piazan, days, start)
+    recomputes = [fire for fire in recorder.fires_of(piazan.schedule_prayer_times.__name__)
+                  if fire.outcome == 'executed']
+    assert len(recomputes) == days
+    # adhans, reminders, iqamas and the Ramadan alerts of March
+    plays = [fire for fire in recorder.fires if fire.outcome == 'executed' and fire.name in PLAY_JOBS]
+    assert len(sink.plays) == len(plays) > 3 * len(SCHEDULED_PRAYERS) * days
+
+
+def test_midnight_recompute_runs_however_late(piazan):
+    start, days = datetime.date(2025, 10, 28), 10
+    recorder, _ = simulate(piazan, days, start, wake_latency=90)
+
+    recomputes = recorder.fires_of(piazan.schedule_prayer_times.__name__)
+    assert [fire.outcome for fire in recomputes] == ['executed'] * days
+    # the adhans are past their grace time, they are reported as missed
+    adhans = recorder.fires_of(piazan.prayer_adhan_function.__name__)
+    assert adhans and all(fire.outcome == 'missed' for fire in adhans)
+
+
+def test_polar_days_schedule_what_exists(piazan):
+    # Tromso, the sun does not set from May 20
+    piazan.config = dataclasses.replace(piazan.config, latitude=69.649205, longitude=18.955324,
+                                        timezone='Europe/Oslo', latitude_adjustment_method=LATITUDE_ADJUSTMENT_METHOD_NONE)
+    piazan.local_timezone = piazan.config.zone()
+    piazan.prayer_schedule = piazan.create_prayer_schedule()
+    start, days = datetime.date(2025, 5, 10), 30
+    recorder, _ = simulate(piazan, days, start)
+
+    assert [fire for fire in recorder.fires if fire.outcome != 'executed'] == []
+    expected = expected_per_day(piazan, days, start)
+    assert min(expected.values()) < len(SCHEDULED_PRAYERS)
+    assert adhans_per_day(piazan, recorder) == {day: count for day, count in expected.items() if count}
@@ -0,0 +1,88 @@
+"""Heartbeat of the daemon against a fake systemd notify socket, with injected faults."""
+
+import os
+import time
+
+import pytest
+
+from daemon.audio import ADHAN
+from daemon.simulation import HungPlayback
+from daemon.watchdog import FakeNotifySocket, SystemdNotifier
+
+
+@pytest.fixture
+def heartbeat(piazan):
+    """Watchdog of the daemon set up with a paused scheduler, its clock moved by hand."""
+    fake_socket = FakeNotifySocket()
+    notifier = SystemdNotifier(fake_socket.address)
+    piazan.load_startup_state()
+    piazan.audio_engine.start()
+    piazan.scheduler = piazan.create_scheduler(use_asyncio=False)
+    piazan.scheduler.start(paused=True)
+    piazan.schedule_prayer_times()
+
+    heartbeat_time = [0.0]
+    dog = piazan.create_watchdog(notifier, lambda: heartbeat_time[0])
+
+    def run_beats(count: int, lag: float = 0.0):
+        """Beat count times, each beat lag seconds late, and return the messages and the last problems."""
+        messages = []
+        problems = []
+        for _ in range(count):
+            heartbeat_time[0] += dog.interval + lag
+            problems = dog.beat()
+            messages.extend(fake_socket.receive())
+        return messages, problems
+
+    dog.run_beats = run_beats
+    # the lag is measured from the previous beat
+    run_beats(1)
+    dog.socket = fake_socket
+    dog.notifier = notifier
+    yield dog
+    fake_socket.close()
+
+
+def assert_triggered(dog, messages):
+    assert [message.get('WATCHDOG') for message in messages] == ['1'] * (dog.failures - 1) + ['trigger']
+
+
+def test_ready_and_healthy_beats(heartbeat):
+    heartbeat.notifier.ready()
+    assert heartbeat.socket.receive() == [{'READY': '1', 'MAINPID': str(os.getpid())}]
+    messages, problems = heartbeat.run_beats(100)
+    assert problems == []
+    assert [message.get('WATCHDOG') for message in messages] == ['1'] * 100
+
+
+def test_missing_prayer_job(piazan, heartbeat):
+    piazan.clear_prayer_jobs()
+    messages, problems = heartbeat.run_beats(heartbeat.failures)
+    assert_triggered(heartbeat, messages)
+    assert any('no job for' in problem for problem in problems)
+
+
+def test_scheduler_lag(heartbeat):
+    messages, _ = heartbeat.run_beats(heartbeat.failures, lag=2 * heartbeat.max_lag)
+    assert_triggered(heartbeat, messages)
+
+
+def test_audio_device_hung(piazan, heartbeat):
+    # a short play on a device that never finishes it
+    piazan.audio_engine.play = lambda segment: HungPlayback()
+    piazan.audio_engine.stuck_grace = 0.0
+    piazan.audio_engine.set_assets({ADHAN: piazan.audio_engine.assets[ADHAN][:10]})
+    piazan.audio_engine.enqueue(ADHAN)
+    time.sleep(0.1)
+    messages, problems = heartbeat.run_beats(heartbeat.failures)
+    assert_triggered(heartbeat, messages)
+    assert any('stuck' in problem for problem in problems)
+    piazan.audio_engine.stop()
+    piazan.audio_engine.wait_idle()
+
+
+def test_audio_thread_stopped(piazan, heartbeat):
+    piazan.audio_engine.close()
+    messages, problems = heartbeat.run_beats(heartbeat.failures)
+    assert_triggered(heartbeat, messages)
+    assert problems == ['audio output thread is not running']